@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+FEATURE_COLUMNS = ["SSA", "APPLICATION_TYPE", "BUSINESS_TYPE"]
+SERVICE_DIR = Path(__file__).resolve().parent.parent / "components" / "03_train_and_package"
+
+def load_replay_requests(path: str) -> list:
+    """Reads one request per line: {"rows": [{"SSA": ..., "APPLICATION_TYPE": ..., "BUSINESS_TYPE": ...}, ...]}."""
+    with open(path) as f:
+        return [pd.DataFrame(json.loads(line)["rows"], columns=FEATURE_COLUMNS) for line in f if line.strip()]
+
+def synthesize_requests(data_path: str, num_requests: int, batch_sizes: list, seed: int = 42) -> list:
+    """Samples request batches of the given sizes from a training dataset."""
+    if Path(data_path).suffix.lower() == ".csv":
+        df = pd.read_csv(data_path, usecols=FEATURE_COLUMNS)
+    else:
+        df = pd.read_parquet(data_path, columns=FEATURE_COLUMNS)
+    rng = random.Random(seed)
+    return [df.sample(n=rng.choice(batch_sizes), replace=True, random_state=rng.randrange(2**31)) for _ in range(num_requests)]
+
+def make_http_predict(url: str):
+    import requests
+    session = threading.local()
+
+    def predict(batch: pd.DataFrame):
+        if not hasattr(session, "client"):
+            session.client = requests.Session()
+        response = session.client.post(
+            f"{url.rstrip('/')}/predict",
+            data=batch.to_json(orient="records"),
+            headers={"Content-Type": "application/json"},
+        )
+        response.raise_for_status()
+    return predict
+
+def scrape_process_metrics(url: str) -> dict:
+    """
+    Server-side CPU seconds and RSS, summed over the process series on the server's
+    /metrics. A series the server does not export (e.g. prometheus_client in
+    multiprocess mode, as under `bentoml serve --production`) is None, not 0.
+    """
+    import requests
+    names = ("process_cpu_seconds_total", "process_resident_memory_bytes")
+    totals = {}
+    response = requests.get(f"{url.rstrip('/')}/metrics", timeout=10)
+    response.raise_for_status()
+    for line in response.text.splitlines():
+        name = line.split("{")[0].split(" ")[0]
+        if name in names:
+            totals[name] = totals.get(name, 0.0) + float(line.rsplit(" ", 1)[1])
+    return {name: totals.get(name) for name in names}
+
+def make_in_process_predict():
+    """Imports the Bento service and runs its runners locally, without an HTTP server."""
+    sys.path.insert(0, str(SERVICE_DIR))
+    import service
+    for runner in service.svc.runners:
+        runner.init_local()
+    return service.svc.apis["predict"].func
+
+def run_benchmark(predict, batches: list, concurrency: int, warmup: int = 5, server_url: str = None) -> dict:
+    """
+    Replays the batches and reports latency and throughput. CPU and RSS are measured
+    in this process, which is the server only in-process; against a server_url they
+    are reported as client_* and the server's own figures are scraped from /metrics.
+    """
+    for batch in batches[:warmup]:
+        predict(batch)
+
+    latencies, errors, successful_rows = [], 0, 0
+    lock = threading.Lock()
+
+    def timed_call(batch):
+        nonlocal errors, successful_rows
+        start = time.perf_counter()
+        try:
+            predict(batch)
+        except Exception as e:
+            with lock:
+                errors += 1
+            print(f"Request failed: {e}")
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            successful_rows += len(batch)
+
+    server_start = scrape_process_metrics(server_url) if server_url else None
+    cpu_start = os.times()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed_call, batches))
+    wall_seconds = time.perf_counter() - wall_start
+    cpu_end = os.times()
+    server_end = scrape_process_metrics(server_url) if server_url else None
+
+    latencies_ms = np.array(latencies) * 1000 if latencies else np.array([np.nan])
+    cpu_seconds = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+    report = {
+        "requests": len(batches),
+        "rows": int(sum(len(batch) for batch in batches)),
+        "errors": errors,
+        "concurrency": concurrency,
+        "wall_seconds": wall_seconds,
+        "throughput_rps": len(latencies) / wall_seconds,
+        "throughput_rows_per_sec": successful_rows / wall_seconds,
+        "latency_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "latency_p95_ms": float(np.percentile(latencies_ms, 95)),
+        "latency_p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+    process = {
+        "cpu_seconds": cpu_seconds,
+        "cpu_utilization": cpu_seconds / wall_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    if server_url is None:
+        report.update(process)
+        return report
+
+    report.update({f"client_{name}": value for name, value in process.items()})
+    server_cpu_seconds = server_cpu_utilization = server_rss_mb = None
+    if server_start["process_cpu_seconds_total"] is not None and server_end["process_cpu_seconds_total"] is not None:
+        server_cpu_seconds = server_end["process_cpu_seconds_total"] - server_start["process_cpu_seconds_total"]
+        server_cpu_utilization = server_cpu_seconds / wall_seconds
+    else:
+        print("WARNING: the server's /metrics has no process_cpu_seconds_total. Server CPU is not reported.")
+    if server_end["process_resident_memory_bytes"] is not None:
+        # Resident memory at the end of the run; /metrics exposes no peak
+        server_rss_mb = server_end["process_resident_memory_bytes"] / 1024 / 1024
+    else:
+        print("WARNING: the server's /metrics has no process_resident_memory_bytes. Server RSS is not reported.")
+    report.update({
+        "server_cpu_seconds": server_cpu_seconds,
+        "server_cpu_utilization": server_cpu_utilization,
+        "server_rss_mb": server_rss_mb,
+    })
+    return report
+
+def check_regression(report: dict, baseline: dict, max_regression: float):
+    """Fails the run if latency or throughput is more than max_regression worse than the baseline."""
+    failures = []
+    for metric in ("latency_p50_ms", "latency_p95_ms", "latency_p99_ms"):
+        if report[metric] > baseline[metric] * (1 + max_regression):
+            failures.append(f"{metric} {report[metric]:.2f} > baseline {baseline[metric]:.2f}")
+    if report["throughput_rps"] < baseline["throughput_rps"] * (1 - max_regression):
+        failures.append(f"throughput_rps {report['throughput_rps']:.2f} < baseline {baseline['throughput_rps']:.2f}")
+    if report["errors"] > baseline.get("errors", 0):
+        failures.append(f"errors {report['errors']} > baseline {baseline.get('errors', 0)}")
+    if failures:
+        raise ValueError("Serving benchmark regressed against baseline: " + "; ".join(failures))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay or synthesize predict traffic against the license classifier service.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="Base URL of a running Bento server, e.g. http://localhost:3000")
+    target.add_argument("--in_process", action="store_true", help="Import the Bento service and run it locally.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--replay", help="JSONL file of recorded requests to replay.")
+    source.add_argument("--synthesize_from", help="Dataset (Parquet or CSV) to sample synthetic requests from.")
+    parser.add_argument("--num_requests", type=int, default=1000)
+    parser.add_argument("--batch_sizes", default="1,8,64", help="Comma-separated request batch sizes for synthetic traffic.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", default="benchmark_report.json")
+    parser.add_argument("--baseline", help="Stored report to compare against.")
+    parser.add_argument("--max_regression", type=float, default=0.10, help="Allowed relative slowdown vs. the baseline.")
+    args = parser.parse_args()
+
+    if args.replay:
+        batches = load_replay_requests(args.replay)
+    else:
+        batches = synthesize_requests(args.synthesize_from, args.num_requests, [int(b) for b in args.batch_sizes.split(",")])
+    predict = make_http_predict(args.url) if args.url else make_in_process_predict()
+
+    print(f"Running {len(batches)} requests at concurrency {args.concurrency}...")
+    report = run_benchmark(predict, batches, concurrency=args.concurrency, server_url=args.url)
+    report["target"] = args.url or "in-process"
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Benchmark report saved to {args.output}")
+
+    # --- PERFORMANCE GATE ---
+    if args.baseline:
+        with open(args.baseline) as f:
+            check_regression(report, json.load(f), args.max_regression)
+        print("Serving benchmark is within the baseline tolerance.")
@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# Entry module of every pipeline step and of the Bento service, relative to the repo root
+TARGETS = {
+    "generate_training_data": ("components/01_generate_training_data", "generate"),
+    "validate_data": ("components/02_validate_data", "validate"),
+    "train_and_package": ("components/03_train_and_package", "train_and_build_bento"),
+    "service": ("components/03_train_and_package", "service"),
+    "validate_model": ("components/04_validate_model", "validate"),
+    "promote_and_trigger": ("components/05_promote_and_trigger", "promote_and_commit"),
+    "batch_score": ("components/06_batch_score", "batch_score"),
+    "drift_report": ("monitoring", "generate_report"),
+}
+
+def parse_importtime(stderr: str) -> list:
+    """(module, self_us, cumulative_us) for each line of CPython's -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+def measure_startup(directory: str, module: str, top: int) -> dict:
+    """
+    Imports one entry module in a fresh interpreter. Each module's own (self) import
+    time is summed per top-level package, so the package totals add up to the
+    entry module's cumulative import time without double counting.
+    """
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(ROOT / "components"), os.environ.get("PYTHONPATH", "")])}
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT / directory, env=env, capture_output=True, text=True,
+    )
+    wall_seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit code {result.returncode}"}
+
+    by_package = defaultdict(int)
+    for name, self_us, _ in parse_importtime(result.stderr):
+        by_package[name.split(".")[0]] += self_us
+    ranked = sorted(by_package.items(), key=lambda item: item[1], reverse=True)
+    return {
+        "import_seconds": sum(by_package.values()) / 1e6,
+        "interpreter_wall_seconds": wall_seconds,
+        "top_packages": [[package, self_us / 1e6] for package, self_us in ranked[:top]],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report per-package import cost of each component entry point.")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="Comma-separated subset of: " + ", ".join(TARGETS))
+    parser.add_argument("--top", type=int, default=10, help="Packages to list per target, by import time.")
+    parser.add_argument("--output", default="startup_report.json")
+    parser.add_argument("--max_import_seconds", type=float, default=None, help="Fail if any target imports slower than this.")
+    args = parser.parse_args()
+
+    report = {}
+    for name in args.targets.split(","):
+        directory, module = TARGETS[name]
+        print(f"Measuring import cost of {directory}/{module}.py...")
+        report[name] = measure_startup(directory, module, args.top)
+        if "error" in report[name]:
+            print(f"  could not import: {report[name]['error']}")
+            continue
+        print(f"  {report[name]['import_seconds']:.2f}s total; " + ", ".join(f"{package} {seconds:.2f}s" for package, seconds in report[name]["top_packages"][:5]))
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Startup report saved to {args.output}")
+
+    # --- PERFORMANCE GATE ---
+    if args.max_import_seconds is not None:
+        slow = [f"{name} {result['import_seconds']:.2f}s" for name, result in report.items() if result.get("import_seconds", 0) > args.max_import_seconds]
+        if slow:
+            raise ValueError(f"Startup regressed beyond {args.max_import_seconds}s: " + "; ".join(slow))
@@ -1,24 +1,124 @@
 import argparse
+import json
+import shutil
 import pandas as pd
+from pathlib import Path
 from feast import FeatureStore
+from common.dataset import dataset_fingerprint, read_dataset, write_dataset, to_table, ENTITY_COLUMNS
+from common.instrumentation import Instrumentation
+from common.step_cache import open_step_cache, step_fingerprint
 
-def generate_data(feast_repo_path: str, output_path: str):
-    store = FeatureStore(repo_path=feast_repo_path)
-    entity_df = store.get_batch_source("license_features_view").to_df()
-    entity_df = entity_df[["event_timestamp", "license_id", "LICENSE_STATUS"]]
-    
-    print("Generating training dataset from Feast...")
-    training_data = store.get_historical_features(
+instrumentation = Instrumentation("generate_training_data")
+
+def _watermark_path(materialized_path: str) -> Path:
+    return Path(f"{materialized_path}.watermark.json")
+
+def load_watermark(materialized_path: str):
+    """Returns the last joined event_timestamp, or None if no incremental state exists."""
+    watermark_path = _watermark_path(materialized_path)
+    if not watermark_path.exists() or not Path(materialized_path).exists():
+        return None
+    with open(watermark_path) as f:
+        return pd.Timestamp(json.load(f)["event_timestamp"])
+
+def save_watermark(materialized_path: str, watermark: pd.Timestamp, rows: int):
+    with open(_watermark_path(materialized_path), 'w') as f:
+        json.dump({"event_timestamp": watermark.isoformat(), "rows": rows}, f)
+
+def _join_features(store: FeatureStore, entity_df: pd.DataFrame) -> pd.DataFrame:
+    return store.get_historical_features(
         entity_df=entity_df,
         features=store.get_feature_view("license_features_view"),
     ).to_df()
 
-    training_data.to_csv(output_path, index=False)
-    print(f"Training dataset created successfully at {output_path}")
+def feature_repo_fingerprint(feast_repo_path: str, source_path: str) -> dict:
+    """Content hashes of the Feast definitions and of the offline source they read from."""
+    repo = Path(feast_repo_path)
+    source = Path(source_path)
+    if not source.is_absolute() and not source.exists():
+        source = repo.parent / source
+    definitions = sorted(repo.glob("*.py")) + sorted(repo.glob("*.yaml"))
+    return {
+        "definitions": {path.name: dataset_fingerprint(path) for path in definitions},
+        "source": dataset_fingerprint(source),
+    }
+
+def generate_data(feast_repo_path: str, output_path: str, materialized_path: str = None, full_rebuild: bool = False,
+                  step_cache_uri: str = "", image_tag: str = ""):
+    """
+    Builds the training dataset from Feast. When a materialized dataset path is
+    given, only entity rows newer than its watermark are joined and merged into
+    it; a missing watermark or full_rebuild falls back to joining all history.
+    With a step cache, an unchanged feature repo and source reuse the last output.
+    """
+    store = FeatureStore(repo_path=feast_repo_path)
+    batch_source = store.get_batch_source("license_features_view")
+
+    step_cache = open_step_cache(step_cache_uri, "generate-training-data")
+    if step_cache:
+        step_key = step_fingerprint("generate-training-data", image_tag, **feature_repo_fingerprint(feast_repo_path, batch_source.path))
+        if step_cache.fetch(step_key, {"training_data": output_path}):
+            return
+
+    with instrumentation.stage("load") as stage:
+        entity_df = batch_source.to_df()
+        entity_df = entity_df[["event_timestamp", "license_id", "LICENSE_STATUS"]].assign(
+            event_timestamp=lambda df: pd.to_datetime(df["event_timestamp"], utc=True)
+        )
+        stage.rows = len(entity_df)
+
+    watermark = None if (full_rebuild or not materialized_path) else load_watermark(materialized_path)
+
+    with instrumentation.stage("transform") as stage:
+        if watermark is None:
+            print("Generating training dataset from Feast (full rebuild)...")
+            training_data = _join_features(store, entity_df)
+            stage.rows = len(entity_df)
+        else:
+            new_entities = entity_df[entity_df["event_timestamp"] > watermark]
+            print(f"Incremental run: {len(new_entities)} new entity rows after watermark {watermark.isoformat()}")
+            existing = read_dataset(materialized_path)
+            if new_entities.empty:
+                training_data = existing
+            else:
+                new_rows = to_table(_join_features(store, new_entities)).to_pandas()
+                training_data = pd.concat([existing, new_rows], ignore_index=True)
+                training_data = training_data.drop_duplicates(subset=ENTITY_COLUMNS, keep="last")
+            stage.rows = len(new_entities)
+
+    with instrumentation.stage("write", rows=len(training_data)):
+        write_dataset(training_data, output_path)
+    print(f"Training dataset created successfully at {output_path} ({len(training_data)} rows)")
+
+    if materialized_path:
+        if Path(materialized_path).resolve() != Path(output_path).resolve():
+            Path(materialized_path).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(output_path, materialized_path)
+        if not entity_df.empty:
+            save_watermark(materialized_path, entity_df["event_timestamp"].max(), len(training_data))
+
+    if step_cache:
+        step_cache.store(step_key, {"training_data": output_path})
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--feast_repo", required=True)
     parser.add_argument("--output", required=True)
+    parser.add_argument("--materialized", default=None, help="Persistent training set to update incrementally.")
+    parser.add_argument("--full_rebuild", default="false", choices=["true", "false"])
+    parser.add_argument("--step_cache", default="", help="Local directory or s3:// URI of the step cache; empty disables it.")
+    parser.add_argument("--image_tag", default="")
+    parser.add_argument("--metrics_output", default=None, help="Write stage timings as JSON to this path.")
     args = parser.parse_args()
-    generate_data(feast_repo_path=args.feast_repo, output_path=args.output)
\ No newline at end of file
+    with instrumentation.profiled():
+        generate_data(
+            feast_repo_path=args.feast_repo,
+            output_path=args.output,
+            materialized_path=args.materialized,
+            full_rebuild=args.full_rebuild == "true",
+            step_cache_uri=args.step_cache,
+            image_tag=args.image_tag
+        )
+    instrumentation.report()
+    if args.metrics_output:
+        instrumentation.write_json(args.metrics_output)
@@ -1,44 +1,191 @@
 import argparse
-import pandas as pd
-from evidently.report import Report
-from evidently.metric_preset import DataQualityPreset
 import json
 from pathlib import Path
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pyarrow.csv as pa_csv
+from common.dataset import ENTITY_COLUMNS, dataset_fingerprint, read_dataset
+from common.instrumentation import Instrumentation
+from common.step_cache import open_step_cache, step_fingerprint
 
-def validate_data(reference_data_path: str, new_data_path: str, report_path: str):
-    print("Loading data for validation...")
-    # For the first run, reference and new data might be the same.
-    # In subsequent runs, new_data would be the fresh pull.
-    reference_df = pd.read_csv(reference_data_path, low_memory=False)
-    new_df = pd.read_csv(new_data_path, low_memory=False)
+# --- Quality thresholds ---
+MAX_MISSING_SHARE_INCREASE = 0.10  # vs. the reference missing share
+MAX_NEW_CATEGORY_SHARE = 0.05      # categorical values never seen in the reference
+
+instrumentation = Instrumentation("validate_data")
+
+def read_table(path: str) -> pa.Table:
+    if Path(path).suffix.lower() == ".csv":
+        return pa_csv.read_csv(path)
+    return pq.read_table(path, memory_map=True)
+
+def profile_table(table: pa.Table) -> dict:
+    """Column statistics computed with vectorized Arrow kernels, one pass per column."""
+    profile = {"rows": table.num_rows, "columns": {}}
+    for name in table.column_names:
+        column = table[name]
+        stats = {
+            "type": str(column.type),
+            "missing_share": column.null_count / table.num_rows if table.num_rows else 0.0,
+        }
+        if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+            min_max = pc.min_max(column)
+            stats.update({
+                "kind": "numeric",
+                "min": min_max["min"].as_py(),
+                "max": min_max["max"].as_py(),
+                "mean": pc.mean(column).as_py(),
+                "std": pc.stddev(column).as_py(),
+            })
+        elif pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            value_counts = {
+                item["values"].as_py(): item["counts"].as_py()
+                for item in pc.value_counts(column) if item["values"].is_valid
+            }
+            stats.update({"kind": "categorical", "unique": len(value_counts), "value_counts": value_counts})
+        else:
+            stats["kind"] = "other"
+        profile["columns"][name] = stats
+    return profile
+
+def load_or_build_profile(path: str, cache_dir: str, fingerprint: str) -> dict:
+    """Profiles a dataset once per content hash (its dataset_fingerprint) and reuses the persisted result afterwards."""
+    cache_path = Path(cache_dir) / f"{fingerprint}.json"
+    if cache_path.exists():
+        print(f"Using cached profile for {path}")
+        with open(cache_path) as f:
+            return json.load(f)
+
+    print(f"Profiling {path}...")
+    profile = profile_table(read_table(path))
+    profile["fingerprint"] = fingerprint
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(cache_path, "w") as f:
+        json.dump(profile, f)
+    return profile
+
+def run_checks(reference: dict, current: dict) -> list:
+    """Compares the new data profile to the reference profile; returns one result per check."""
+    checks = [{"check": "non_empty", "passed": current["rows"] > 0, "value": current["rows"]}]
+    for name, ref in reference["columns"].items():
+        cur = current["columns"].get(name)
+        if cur is None:
+            checks.append({"check": "column_present", "column": name, "passed": False})
+            continue
+        checks.append({"check": "column_type", "column": name, "passed": cur["type"] == ref["type"], "value": cur["type"]})
+        checks.append({
+            "check": "missing_share", "column": name, "value": cur["missing_share"],
+            "passed": cur["missing_share"] <= ref["missing_share"] + MAX_MISSING_SHARE_INCREASE,
+        })
+        if name in ENTITY_COLUMNS:
+            # IDs and timestamps of fresh data lie outside the reference by design
+            continue
+        if ref["kind"] == "numeric" and cur["kind"] == "numeric" and ref["min"] is not None and cur["min"] is not None:
+            # New data must stay within the reference extremes
+            in_range = cur["min"] >= ref["min"] and cur["max"] <= ref["max"]
+            checks.append({"check": "value_range", "column": name, "passed": in_range, "value": [cur["min"], cur["max"]]})
+        elif ref["kind"] == "categorical" and cur["kind"] == "categorical":
+            known = set(ref["value_counts"])
+            total = sum(cur["value_counts"].values())
+            new_share = sum(count for value, count in cur["value_counts"].items() if value not in known) / total if total else 0.0
+            checks.append({"check": "new_categories", "column": name, "value": new_share, "passed": new_share <= MAX_NEW_CATEGORY_SHARE})
+    return checks
+
+def save_full_report(reference_data_path: str, new_data_path: str, full_report_path: str):
+    """Optional Evidently DataQualityPreset report; not needed for the gate decision."""
+    from evidently.report import Report
+    from evidently.metric_preset import DataQualityPreset
 
-    print("Generating data quality report...")
     data_quality_report = Report(metrics=[DataQualityPreset()])
-    data_quality_report.run(reference_data=reference_df, current_data=new_df)
-    
-    report_dict = data_quality_report.as_dict()
-    
-    output_dir = Path(report_path).parent
-    output_dir.mkdir(parents=True, exist_ok=True)
-    with open(report_path, 'w') as f:
-        json.dump(report_dict, f, indent=4)
-    print(f"Full data quality report saved to {report_path}")
+    data_quality_report.run(reference_data=read_dataset(reference_data_path), current_data=read_dataset(new_data_path))
+    Path(full_report_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(full_report_path, 'w') as f:
+        json.dump(data_quality_report.as_dict(), f)
+    print(f"Full data quality report saved to {full_report_path}")
+
+def validate_data(reference_data_path: str, new_data_path: str, report_path: str,
+                  profile_cache_dir: str = "/app/cache/profiles", full_report_path: str = None,
+                  step_cache_uri: str = "", image_tag: str = ""):
+    # Only passing runs are cached, so a hit means the same data already cleared the gate
+    step_cache = open_step_cache(step_cache_uri, "validate-data")
+    outputs = {"report": report_path, **({"full_report": full_report_path} if full_report_path else {})}
+    # Each input is hashed once, for both the step key and the profile cache
+    fingerprints = {path: dataset_fingerprint(path) for path in {reference_data_path, new_data_path}}
+    if step_cache:
+        step_key = step_fingerprint(
+            "validate-data", image_tag,
+            reference=fingerprints[reference_data_path],
+            new_data=fingerprints[new_data_path],
+            thresholds={"max_missing_share_increase": MAX_MISSING_SHARE_INCREASE, "max_new_category_share": MAX_NEW_CATEGORY_SHARE},
+        )
+        if step_cache.fetch(step_key, outputs):
+            return
+
+    print("Loading data profiles for validation...")
+    # For the first run, reference and new data might be the same file; the
+    # content-hashed cache then profiles it only once.
+    with instrumentation.stage("profile") as stage:
+        reference_profile = load_or_build_profile(reference_data_path, profile_cache_dir, fingerprints[reference_data_path])
+        new_profile = load_or_build_profile(new_data_path, profile_cache_dir, fingerprints[new_data_path])
+        stage.rows = reference_profile["rows"] + new_profile["rows"]
+
+    with instrumentation.stage("checks"):
+        checks = run_checks(reference_profile, new_profile)
+    failed = [check for check in checks if not check["passed"]]
+    summary = {
+        "all_passed": not failed,
+        "checks_run": len(checks),
+        "checks_failed": len(failed),
+        "failed_checks": failed,
+        "reference_fingerprint": reference_profile["fingerprint"],
+        "new_data_fingerprint": new_profile["fingerprint"],
+        "new_data_profile": {name: {k: v for k, v in stats.items() if k != "value_counts"} for name, stats in new_profile["columns"].items()},
+    }
+
+    with instrumentation.stage("report"):
+        output_dir = Path(report_path).parent
+        output_dir.mkdir(parents=True, exist_ok=True)
+        with open(report_path, 'w') as f:
+            json.dump(summary, f)
+        print(f"Data quality summary saved to {report_path}")
+
+        if full_report_path:
+            save_full_report(reference_data_path, new_data_path, full_report_path)
 
     # --- QUALITY GATE ---
     # Fail the pipeline if critical quality checks are not met.
-    if not report_dict['metrics'][0]['result']['summary']['all_passed']:
-        raise ValueError("Data validation failed: Not all quality metrics passed. Check the report.")
-        
+    if failed:
+        raise ValueError(f"Data validation failed: {len(failed)} of {len(checks)} quality checks failed. Check the report.")
+
     print("Data validation successful!")
+    if step_cache:
+        step_cache.store(step_key, outputs)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--reference_data", required=True)
     parser.add_argument("--new_data", required=True)
     parser.add_argument("--report", required=True)
+    parser.add_argument("--profile_cache_dir", default="/app/cache/profiles")
+    parser.add_argument("--full_report", default=None, help="Also write the full Evidently report to this path.")
+    parser.add_argument("--step_cache", default="", help="Local directory or s3:// URI of the step cache; empty disables it.")
+    parser.add_argument("--image_tag", default="")
+    parser.add_argument("--metrics_output", default=None, help="Write stage timings as JSON to this path.")
     args = parser.parse_args()
-    validate_data(
-        reference_data_path=args.reference_data,
-        new_data_path=args.new_data,
-        report_path=args.report
-    )
\ No newline at end of file
+    try:
+        with instrumentation.profiled():
+            validate_data(
+                reference_data_path=args.reference_data,
+                new_data_path=args.new_data,
+                report_path=args.report,
+                profile_cache_dir=args.profile_cache_dir,
+                full_report_path=args.full_report,
+                step_cache_uri=args.step_cache,
+                image_tag=args.image_tag
+            )
+    finally:
+        # Timings are kept for failed gates too
+        instrumentation.report()
+        if args.metrics_output:
+            instrumentation.write_json(args.metrics_output)
@@ -0,0 +1,56 @@
+import threading
+import time
+from collections import OrderedDict
+
+class FeatureCache:
+    """
+    Bounded LRU cache of per-license feature rows, each entry expiring after a TTL.
+    Keys the online store does not know are cached as None for a shorter TTL, so
+    repeated lookups of missing licenses don't reach the store every time.
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl_seconds: float = 300.0, negative_ttl_seconds: float = 30.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: list):
+        """Returns (found, missing): cached rows by key (None if known to be absent) and the keys that must be fetched."""
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[1]
+                else:
+                    if entry is not None:
+                        del self._entries[key]
+                    missing.append(key)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, rows: dict):
+        self._put(rows, self.ttl_seconds)
+
+    def put_missing(self, keys: list):
+        self._put(dict.fromkeys(keys), self.negative_ttl_seconds)
+
+    def _put(self, rows: dict, ttl_seconds: float):
+        expires_at = time.monotonic() + ttl_seconds
+        with self._lock:
+            for key, row in rows.items():
+                self._entries[key] = (expires_at, row)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,89 @@
+import atexit
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from prometheus_client import Counter
+
+DROPPED_RECORDS = Counter("inference_log_dropped_records", "Inference log records dropped because the write queue was full")
+
+class InferenceLogger:
+    """
+    Append-only inference log written off the request path. Requests only enqueue
+    a record; a background thread flushes batches as immutable Parquet parts under
+    one directory per hour (hour=YYYY-MM-DDTHH/part-*.parquet). When the bounded
+    queue is full, records are dropped and counted instead of blocking the request.
+    """
+
+    def __init__(self, log_dir: str, max_queue_size: int = 10_000, flush_rows: int = 5_000, flush_interval_seconds: float = 30.0):
+        self.log_dir = Path(log_dir)
+        self.flush_rows = flush_rows
+        self.flush_interval_seconds = flush_interval_seconds
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="inference-logger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, input_df: pd.DataFrame, predictions, latency_seconds: float):
+        try:
+            self._queue.put_nowait((datetime.now(timezone.utc), input_df, predictions, latency_seconds))
+        except queue.Full:
+            self.dropped += 1
+            DROPPED_RECORDS.inc()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=self.flush_interval_seconds)
+
+    def _run(self):
+        pending, pending_rows = [], 0
+        last_flush = time.monotonic()
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                record = self._queue.get(timeout=1.0)
+                pending.append(record)
+                pending_rows += len(record[1])
+            except queue.Empty:
+                pass
+            if pending and (pending_rows >= self.flush_rows or time.monotonic() - last_flush >= self.flush_interval_seconds or self._stop.is_set()):
+                self._safe_flush(pending, pending_rows)
+                pending, pending_rows = [], 0
+                last_flush = time.monotonic()
+        # _stop may be set between the flush check and the loop test
+        if pending:
+            self._safe_flush(pending, pending_rows)
+
+    def _safe_flush(self, records: list, rows: int):
+        try:
+            self._flush(records)
+        except Exception as e:
+            print(f"ERROR: Failed to write inference log batch of {rows} rows: {e}")
+
+    @staticmethod
+    def _to_frame(record) -> pd.DataFrame:
+        timestamp, input_df, predictions, latency_seconds = record
+        predictions = np.asarray(predictions)
+        frame = input_df.reset_index(drop=True).copy()
+        frame["prediction"] = predictions.argmax(axis=1) if predictions.ndim == 2 else predictions
+        frame["latency_ms"] = latency_seconds * 1000
+        frame["timestamp"] = timestamp
+        return frame
+
+    def _flush(self, records: list):
+        batch = pd.concat([self._to_frame(record) for record in records], ignore_index=True)
+        for hour, rows in batch.groupby(batch["timestamp"].dt.strftime("%Y-%m-%dT%H")):
+            hour_dir = self.log_dir / f"hour={hour}"
+            hour_dir.mkdir(parents=True, exist_ok=True)
+            table = pa.Table.from_pandas(rows, preserve_index=False)
+            # Write under a temporary name and rename, so readers never see partial files
+            tmp_path = hour_dir / f".part-{uuid.uuid4().hex}.tmp"
+            pq.write_table(table, tmp_path, compression="snappy")
+            tmp_path.rename(hour_dir / f"part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.parquet")
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+class NumpyLicenseClassifier:
+    """
+    TensorFlow-free copy of the fitted preprocessing + Dense network. Holds the
+    one-hot categories and layer weights as plain arrays so serving only needs NumPy.
+    """
+
+    def __init__(self, num_features: list, cat_features: list, categories: list, layers: list, classes: np.ndarray):
+        self.num_features = num_features
+        self.cat_features = cat_features
+        self.categories = [pd.Index(cats) for cats in categories]
+        # [(kernel, bias, activation), ...] in forward order
+        self.layers = layers
+        self.classes_ = classes
+        self.n_features_out = len(num_features) + sum(len(cats) for cats in categories)
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """Compiles a fitted ColumnTransformer + KerasClassifier pipeline."""
+        preprocessor = pipeline.named_steps['preprocessor']
+        classifier = pipeline.named_steps['classifier']
+        transformers = {name: columns for name, _, columns in preprocessor.transformers_}
+        encoder = preprocessor.named_transformers_['cat']
+
+        layers = []
+        for layer in classifier.model.layers:
+            if not layer.get_weights():
+                continue
+            kernel, bias = layer.get_weights()
+            layers.append((kernel.astype(np.float32), bias.astype(np.float32), layer.get_config()['activation']))
+        return cls(list(transformers['num']), list(transformers['cat']), encoder.categories_, layers, np.asarray(classifier.classes_))
+
+    def transform(self, X: pd.DataFrame) -> np.ndarray:
+        """Equivalent of the ColumnTransformer: numeric passthrough, then one-hot with unknowns ignored."""
+        out = np.zeros((len(X), self.n_features_out), dtype=np.float32)
+        offset = len(self.num_features)
+        if self.num_features:
+            out[:, :offset] = X[self.num_features].to_numpy(dtype=np.float32)
+        rows = np.arange(len(X))
+        for col, cats in zip(self.cat_features, self.categories):
+            codes = cats.get_indexer(X[col])
+            known = codes >= 0
+            out[rows[known], offset + codes[known]] = 1.0
+            offset += len(cats)
+        return out
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        activations = self.transform(X)
+        for kernel, bias, activation in self.layers:
+            activations = activations @ kernel + bias
+            if activation == 'relu':
+                np.maximum(activations, 0, out=activations)
+            elif activation == 'softmax':
+                activations = np.exp(activations - activations.max(axis=1, keepdims=True))
+                activations /= activations.sum(axis=1, keepdims=True)
+        return activations
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
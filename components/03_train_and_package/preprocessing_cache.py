@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+import joblib
+import numpy as np
+import pandas as pd
+from common.dataset import dataset_fingerprint
+
+def cache_key(data_path: str, settings: dict) -> str:
+    """Content hash of the dataset plus every setting that changes the preprocessed output."""
+    payload = json.dumps({"data": dataset_fingerprint(data_path), **settings}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+class PreprocessingCache:
+    """
+    On-disk cache of a fitted preprocessor and its transformed train/test splits.
+    Entries are evicted least-recently-used first once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def load(self, key: str):
+        entry = self.cache_dir / key
+        if not (entry / "complete").exists():
+            return None
+        os.utime(entry)  # Marks the entry as recently used
+        with open(entry / "meta.json") as f:
+            meta = json.load(f)
+        return {
+            "preprocessor": joblib.load(entry / "preprocessor.joblib"),
+            "Xt_train": np.load(entry / "Xt_train.npy"),
+            "Xt_test": np.load(entry / "Xt_test.npy"),
+            "y_train": pd.DataFrame(np.load(entry / "y_train.npy"), columns=meta["classes"]),
+            "y_test": pd.DataFrame(np.load(entry / "y_test.npy"), columns=meta["classes"]),
+            "X_test": pd.read_parquet(entry / "X_test.parquet"),
+        }
+
+    def store(self, key: str, artifacts: dict):
+        size = sum(artifacts[name].nbytes for name in ("Xt_train", "Xt_test"))
+        if size > self.max_bytes:
+            # It would only evict everything else and then itself
+            print(f"Preprocessed splits ({size / 1024 ** 2:.0f} MB) exceed the {self.max_bytes / 1024 ** 2:.0f} MB cache, not caching them.")
+            return
+        entry = self.cache_dir / key
+        tmp_entry = self.cache_dir / f".{key}.tmp"
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        tmp_entry.mkdir(parents=True)
+        joblib.dump(artifacts["preprocessor"], tmp_entry / "preprocessor.joblib")
+        np.save(tmp_entry / "Xt_train.npy", artifacts["Xt_train"])
+        np.save(tmp_entry / "Xt_test.npy", artifacts["Xt_test"])
+        np.save(tmp_entry / "y_train.npy", artifacts["y_train"].to_numpy())
+        np.save(tmp_entry / "y_test.npy", artifacts["y_test"].to_numpy())
+        artifacts["X_test"].to_parquet(tmp_entry / "X_test.parquet", index=False)
+        with open(tmp_entry / "meta.json", "w") as f:
+            json.dump({"classes": [str(c) for c in artifacts["y_train"].columns]}, f)
+        (tmp_entry / "complete").touch()
+        shutil.rmtree(entry, ignore_errors=True)
+        tmp_entry.rename(entry)
+        self.evict(keep=entry)
+
+    def evict(self, keep: Path = None):
+        entries = [p for p in self.cache_dir.iterdir() if p.is_dir() and not p.name.startswith(".")]
+        sizes = {p: sum(f.stat().st_size for f in p.rglob("*") if f.is_file()) for p in entries}
+        total = sum(sizes.values())
+        for entry in sorted(entries, key=lambda p: p.stat().st_mtime):
+            if total <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            print(f"Evicting preprocessing cache entry {entry.name}")
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= sizes[entry]
@@ -1,10 +1,174 @@
+import atexit
+import os
+import time
 import bentoml
-from bentoml.io import PandasDataFrame
+import pandas as pd
+from bentoml.io import JSON, PandasDataFrame
+from prometheus_client import Histogram
+from common.instrumentation import Instrumentation
+from feature_cache import FeatureCache
 
-license_classifier_runner = bentoml.sklearn.get("license_classifier:latest").to_runner()
+FEATURE_VIEW = "license_features_view"
+FEATURE_NAMES = ["SSA", "APPLICATION_TYPE", "BUSINESS_TYPE"]
+
+# "numpy" serves the exported TensorFlow-free model; "keras" the original sklearn pipeline
+MODEL_VARIANT = os.getenv("LICENSE_MODEL_VARIANT", "keras")
+
+# Only the model store entry is resolved here; the runner loads the model (and, for the
+# keras variant, TensorFlow) in its own process. Pinning an exact tag through the
+# environment skips the store's "latest" lookup on every replica start.
+if MODEL_VARIANT == "numpy":
+    license_model = bentoml.picklable_model.get(os.getenv("LICENSE_NUMPY_MODEL_TAG", "license-classifier-numpy:latest"))
+else:
+    license_model = bentoml.sklearn.get(os.getenv("LICENSE_MODEL_TAG", "license_classifier:latest"))
+
+# Set on every request row by the API server and dropped by the runner, which derives
+# the adaptive batching queue wait from it
+ENQUEUED_AT_COLUMN = "__enqueued_at"
+
+# Exposed on the service's /metrics endpoint. Request sizes and the runner round trip
+# are measured on the API side; batch sizes and queue waits inside the runner, once
+# adaptive batching has merged the requests. With `bentoml serve --production` the
+# runner processes report through prometheus_client's multiprocess mode.
+REQUEST_ROWS = Histogram(
+    "license_classifier_request_rows", "Rows per predict request submitted to the runner, before adaptive batching",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096),
+)
+RUNNER_CALL_SECONDS = Histogram(
+    "license_classifier_runner_call_seconds", "Round trip of one runner call: batching queue wait plus inference",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+BATCH_ROWS = Histogram(
+    "license_classifier_batch_rows", "Rows per batch dispatched to the model by adaptive batching",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096),
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "license_classifier_queue_wait_seconds", "Time from a request entering the runner queue to its batch being dispatched",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+class LicenseClassifierRunnable(bentoml.Runnable):
+    """Runs the saved model variant, observing the size and queue wait of every dispatched batch."""
+    SUPPORTED_RESOURCES = ("cpu",)
+    SUPPORTS_CPU_MULTI_THREADING = True
+
+    def __init__(self):
+        framework = bentoml.picklable_model if MODEL_VARIANT == "numpy" else bentoml.sklearn
+        self.model = framework.load_model(license_model.tag)
+
+    @bentoml.Runnable.method(batchable=True, batch_dim=0)
+    def predict(self, input_df: pd.DataFrame):
+        dispatched_at = time.time()
+        enqueued_at = input_df.pop(ENQUEUED_AT_COLUMN)
+        BATCH_ROWS.observe(len(input_df))
+        # Every request carries one timestamp, so each distinct value is one request
+        for request_enqueued_at in enqueued_at.unique():
+            QUEUE_WAIT_SECONDS.observe(max(dispatched_at - request_enqueued_at, 0.0))
+        return self.model.predict(input_df)
+
+# Adaptive batching settings are stored with the model at training time (params.yaml
+# -> deployment.serving); the Seldon manifest can override them through the environment.
+# Runner workers per CPU are not read here: BentoML takes them from BENTOML_CONFIG_OPTIONS
+# (runners.workers_per_resource), which the Seldon manifest sets.
+serving_config = license_model.info.metadata.get("serving", {})
+license_classifier_runner = bentoml.Runner(
+    LicenseClassifierRunnable,
+    name=license_model.tag.name,
+    models=[license_model],
+    max_batch_size=int(os.getenv("SERVING_MAX_BATCH_SIZE", serving_config.get("max_batch_size", 100))),
+    max_latency_ms=int(os.getenv("SERVING_MAX_LATENCY_MS", serving_config.get("max_latency_ms", 10000))),
+)
 
 svc = bentoml.Service("license_classifier_service", runners=[license_classifier_runner])
 
+# Hot license features are kept in-process so repeated scoring skips the online store
+feature_cache = FeatureCache(
+    max_size=int(os.getenv("FEATURE_CACHE_MAX_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("FEATURE_CACHE_TTL_SECONDS", "300")),
+    negative_ttl_seconds=float(os.getenv("FEATURE_CACHE_NEGATIVE_TTL_SECONDS", "30")),
+)
+_feature_store = None
+
+# Per-stage latency and row counters on the same /metrics endpoint; peak memory is covered
+# by the client's default process_resident_memory_bytes. Requests run on worker threads,
+# so INSTRUMENTATION_PROFILE=py-spy is the useful profiling mode here.
+instrumentation = Instrumentation("license_classifier_service", prometheus=True)
+instrumentation.start_profiling()
+atexit.register(instrumentation.stop_profiling)
+
+# Inputs, predictions and latency feed the monitoring jobs; disabled unless a log directory
+# is set, in which case the Parquet writer (pyarrow) is imported as well
+inference_logger = None
+if os.getenv("INFERENCE_LOG_DIR"):
+    from inference_log import InferenceLogger
+    inference_logger = InferenceLogger(
+        os.environ["INFERENCE_LOG_DIR"],
+        max_queue_size=int(os.getenv("INFERENCE_LOG_QUEUE_SIZE", "10000")),
+        flush_rows=int(os.getenv("INFERENCE_LOG_FLUSH_ROWS", "5000")),
+        flush_interval_seconds=float(os.getenv("INFERENCE_LOG_FLUSH_SECONDS", "30")),
+    )
+
+def run_model(input_df: pd.DataFrame):
+    REQUEST_ROWS.observe(len(input_df))
+    start = time.perf_counter()
+    with instrumentation.stage("predict", rows=len(input_df)):
+        predictions = license_classifier_runner.predict.run(input_df.assign(**{ENQUEUED_AT_COLUMN: time.time()}))
+    latency = time.perf_counter() - start
+    RUNNER_CALL_SECONDS.observe(latency)
+    if inference_logger is not None:
+        inference_logger.log(input_df, predictions, latency)
+    return predictions
+
+def get_feature_store():
+    """
+    Opens the Feast repo (SQLite online store) on first use only. The repo is not part
+    of the Bento; the Seldon manifest mounts it and sets FEAST_REPO_PATH.
+    """
+    global _feature_store
+    if _feature_store is None:
+        from feast import FeatureStore
+        _feature_store = FeatureStore(repo_path=os.getenv("FEAST_REPO_PATH", "feature_repo"))
+    return _feature_store
+
+def fetch_online_features(license_ids: list) -> dict:
+    """Fetches features for all given licenses in one bulk online lookup; unknown licenses are omitted."""
+    response = get_feature_store().get_online_features(
+        features=[f"{FEATURE_VIEW}:{name}" for name in FEATURE_NAMES],
+        entity_rows=[{"license_id": license_id} for license_id in license_ids],
+    ).to_dict()
+    rows = {}
+    for i, license_id in enumerate(response["license_id"]):
+        row = {name: response[name][i] for name in FEATURE_NAMES}
+        if any(value is not None for value in row.values()):
+            rows[license_id] = row
+    return rows
+
 @svc.api(input=PandasDataFrame(), output=PandasDataFrame())
 def predict(input_df):
-    return license_classifier_runner.predict.run(input_df)
\ No newline at end of file
+    return run_model(input_df)
+
+@svc.api(input=JSON(), output=JSON())
+def predict_by_license_id(request: dict) -> dict:
+    """Scores licenses by ID, e.g. {"license_ids": [1476582, 1639294]}."""
+    license_ids = [int(license_id) for license_id in request["license_ids"]]
+    features, missing = feature_cache.get_many(license_ids)
+    hits, misses = len(features), len(missing)
+    if missing:
+        with instrumentation.stage("fetch_features", rows=len(missing)):
+            fetched = fetch_online_features(missing)
+        feature_cache.put_many(fetched)
+        feature_cache.put_missing([license_id for license_id in missing if license_id not in fetched])
+        features.update(fetched)
+
+    scored_ids = [license_id for license_id in license_ids if features.get(license_id) is not None]
+    predictions = []
+    if scored_ids:
+        input_df = pd.DataFrame([features[license_id] for license_id in scored_ids], columns=FEATURE_NAMES)
+        predictions = run_model(input_df).tolist()
+
+    return {
+        "license_ids": scored_ids,
+        "predictions": predictions,
+        "not_found": [license_id for license_id in license_ids if features.get(license_id) is None],
+        "cache": {"hits": hits, "misses": misses, "totals": feature_cache.stats()},
+    }
@@ -0,0 +1,93 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import tensorflow as tf
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import OneHotEncoder
+from common.dataset import TRAINING_SCHEMA, FEATURE_COLUMNS, LABEL_COLUMN
+
+CAT_FEATURES = [name for name in FEATURE_COLUMNS if pa.types.is_string(TRAINING_SCHEMA.field(name).type)]
+NUM_FEATURES = [name for name in FEATURE_COLUMNS if name not in CAT_FEATURES]
+
+class StreamingDataset:
+    """
+    Reads a Parquet training set one row group at a time. The train/test split is
+    drawn per row group from a seeded generator, so every pass sees the same split
+    without holding the dataset in memory.
+    """
+
+    def __init__(self, data_path: str, test_size: float, random_state: int):
+        if Path(data_path).suffix.lower() != ".parquet":
+            raise ValueError(f"Streaming training requires a Parquet dataset, got {data_path}")
+        self.data_path = data_path
+        self.test_size = test_size
+        self.random_state = random_state
+        self.num_row_groups = pq.ParquetFile(data_path).num_row_groups
+
+    def read_split(self, row_group: int, test: bool, columns: list = None) -> pd.DataFrame:
+        df = pq.ParquetFile(self.data_path).read_row_group(row_group, columns=columns or FEATURE_COLUMNS + [LABEL_COLUMN]).to_pandas()
+        is_test = np.random.default_rng(self.random_state + row_group).random(len(df)) < self.test_size
+        return df[is_test] if test else df[~is_test]
+
+    def scan(self):
+        """One pass over the categorical and label columns to collect the encoder categories and classes."""
+        categories = {col: set() for col in CAT_FEATURES}
+        classes = set()
+        parquet_file = pq.ParquetFile(self.data_path)
+        for row_group in range(self.num_row_groups):
+            df = parquet_file.read_row_group(row_group, columns=CAT_FEATURES + [LABEL_COLUMN]).to_pandas()
+            for col in CAT_FEATURES:
+                categories[col].update(df[col].dropna().unique())
+            classes.update(df[LABEL_COLUMN].dropna().unique())
+        return {col: sorted(values) for col, values in categories.items()}, np.array(sorted(classes))
+
+    def sample(self, test: bool, max_rows: int) -> pd.DataFrame:
+        """First max_rows rows of a split, e.g. for parity checks on the packaged model."""
+        parts, rows = [], 0
+        for row_group in range(self.num_row_groups):
+            part = self.read_split(row_group, test)
+            parts.append(part)
+            rows += len(part)
+            if rows >= max_rows:
+                break
+        return pd.concat(parts, ignore_index=True).iloc[:max_rows]
+
+def fit_streaming_preprocessor(categories: dict, example: pd.DataFrame) -> ColumnTransformer:
+    """Fits the same ColumnTransformer as the in-memory path, with categories from the full scan."""
+    preprocessor = ColumnTransformer(transformers=[
+        ('num', 'passthrough', NUM_FEATURES),
+        ('cat', OneHotEncoder(categories=[categories[col] for col in CAT_FEATURES], handle_unknown='ignore', sparse=False), CAT_FEATURES)
+    ])
+    return preprocessor.fit(example[FEATURE_COLUMNS])
+
+def make_tf_dataset(dataset: StreamingDataset, preprocessor: ColumnTransformer, classes: np.ndarray,
+                    test: bool, batch_size: int, workers: int) -> tf.data.Dataset:
+    """
+    Prefetching input pipeline: row groups are read and encoded by up to `workers`
+    parallel generators, each yielding one-hot encoded batches of batch_size rows.
+    """
+    n_features = len(NUM_FEATURES) + sum(len(cats) for cats in preprocessor.named_transformers_['cat'].categories_)
+
+    def encoded_batches(row_group):
+        df = dataset.read_split(int(row_group), test)
+        for start in range(0, len(df), batch_size):
+            part = df.iloc[start:start + batch_size]
+            x = preprocessor.transform(part[FEATURE_COLUMNS]).astype(np.float32)
+            y = (part[LABEL_COLUMN].to_numpy()[:, None] == classes[None, :]).astype(np.float32)
+            yield x, y
+
+    output_signature = (
+        tf.TensorSpec(shape=(None, n_features), dtype=tf.float32),
+        tf.TensorSpec(shape=(None, len(classes)), dtype=tf.float32),
+    )
+    row_groups = tf.data.Dataset.range(dataset.num_row_groups)
+    if not test:
+        row_groups = row_groups.shuffle(dataset.num_row_groups, seed=dataset.random_state, reshuffle_each_iteration=True)
+    return row_groups.interleave(
+        lambda row_group: tf.data.Dataset.from_generator(encoded_batches, args=(row_group,), output_signature=output_signature),
+        cycle_length=workers,
+        num_parallel_calls=workers,
+        deterministic=test,
+    ).prefetch(tf.data.AUTOTUNE)
@@ -1,87 +1,319 @@
 import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import numpy as np
 import pandas as pd
-import mlflow
-import bentoml
+from pathlib import Path
 import yaml
+import sklearn
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from tensorflow import keras
-from tensorflow.keras import layers
+from common.dataset import dataset_fingerprint, read_dataset, TRAINING_SCHEMA, FEATURE_COLUMNS, NON_FEATURE_COLUMNS, LABEL_COLUMN
+from common.instrumentation import Instrumentation
+from common.step_cache import open_step_cache, step_fingerprint
+from numpy_model import NumpyLicenseClassifier
+from preprocessing_cache import PreprocessingCache, cache_key
+# TensorFlow, MLflow and BentoML are imported where they are used: step-cache hits and
+# the tuning workers that import build_model never pay for the ones they don't need.
 
-def train_and_build(config_path: str, data_path: str, bento_tag_output: str):
+TEST_SIZE = 0.2
+# Held-out rows kept for the NumPy parity check and variant benchmarks
+CHECK_SAMPLE_ROWS = 10_000
+
+instrumentation = Instrumentation("train_and_package")
+
+def preprocess(df: pd.DataFrame, random_state: int) -> dict:
+    """Splits the dataset and fits the encoder, transforming each split exactly once."""
+    X = df.drop(columns=NON_FEATURE_COLUMNS)
+    y = pd.get_dummies(df[LABEL_COLUMN])
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=random_state)
+
+    cat_features = X.select_dtypes(include=['object', 'string']).columns.tolist()
+    num_features = X.select_dtypes(include=['number']).columns.tolist()
+
+    preprocessor = ColumnTransformer(transformers=[
+        ('num', 'passthrough', num_features),
+        ('cat', OneHotEncoder(handle_unknown='ignore', sparse=False), cat_features)
+    ])
+    # Keras trains in float32 anyway; this halves the dense one-hot matrices in memory and in the cache
+    Xt_train = preprocessor.fit_transform(X_train).astype(np.float32, copy=False)
+    Xt_test = preprocessor.transform(X_test).astype(np.float32, copy=False)
+    return {
+        "preprocessor": preprocessor,
+        "Xt_train": Xt_train,
+        "Xt_test": Xt_test,
+        "y_train": y_train,
+        "y_test": y_test,
+        "X_test": X_test,
+    }
+
+def load_or_preprocess(data_path: str, training_config: dict):
+    """Reuses cached preprocessing outputs when neither the dataset nor the split settings changed."""
+    cache = PreprocessingCache(
+        training_config['preprocessing_cache_dir'],
+        max_bytes=training_config['preprocessing_cache_max_mb'] * 1024 * 1024
+    )
+    key = cache_key(data_path, {
+        "random_state": training_config['random_state'],
+        "test_size": TEST_SIZE,
+        "columns": TRAINING_SCHEMA.names,
+        "sklearn": sklearn.__version__,
+        "dtype": "float32",
+    })
+    artifacts = cache.load(key)
+    if artifacts is not None:
+        print(f"Preprocessing cache hit ({key}), skipping preprocessing.")
+        return artifacts, True
+
+    print(f"Preprocessing cache miss ({key}), fitting the encoder...")
+    df = read_dataset(data_path, columns=TRAINING_SCHEMA.names)
+    artifacts = preprocess(df, training_config['random_state'])
+    cache.store(key, artifacts)
+    return artifacts, False
+
+def export_numpy_model(pipeline, X_check: pd.DataFrame, atol: float) -> NumpyLicenseClassifier:
+    """Compiles the fitted pipeline to NumPy and checks it reproduces the Keras probabilities."""
+    numpy_model = NumpyLicenseClassifier.from_pipeline(pipeline)
+    keras_proba = pipeline.predict_proba(X_check)
+    numpy_proba = numpy_model.predict_proba(X_check)
+    max_abs_diff = float(np.nanmax(np.abs(keras_proba - numpy_proba))) if len(X_check) else 0.0
+    print(f"NumPy export max absolute probability difference: {max_abs_diff:.2e}")
+    if not np.allclose(keras_proba, numpy_proba, atol=atol, equal_nan=True):
+        raise ValueError(f"NumPy export parity check failed: max difference {max_abs_diff:.2e} exceeds {atol:.0e}.")
+    return numpy_model
+
+def benchmark_variants(variants: dict, X_sample: pd.DataFrame, batch_size: int) -> dict:
+    """Times each saved model variant in its own interpreter; returns flat metrics per variant."""
+    script = Path(__file__).resolve().parent / "variant_benchmark.py"
+    metrics = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sample_path = str(Path(tmp_dir) / "sample.parquet")
+        # Each variant times a single batch, so only that many rows are handed over
+        X_sample.iloc[:batch_size].to_parquet(sample_path, index=False)
+        for variant, (framework, model_tag) in variants.items():
+            result = subprocess.run(
+                [sys.executable, str(script), "--framework", framework, "--model_tag", model_tag,
+                 "--data", sample_path, "--batch_size", str(batch_size)],
+                check=True, capture_output=True, text=True
+            )
+            for name, value in json.loads(result.stdout.strip().splitlines()[-1]).items():
+                metrics[f"{variant}_{name}"] = value
+    return metrics
+
+def build_model(input_shape: int, n_classes: int, hidden_units: list = (128, 64), learning_rate: float = 0.001):
+    from tensorflow import keras
+    from tensorflow.keras import layers
+    model = keras.Sequential(
+        [layers.InputLayer(input_shape=(input_shape,))]
+        + [layers.Dense(units, activation="relu") for units in hidden_units]
+        + [layers.Dense(n_classes, activation="softmax")]
+    )
+    model.compile(loss="categorical_crossentropy", optimizer=keras.optimizers.Adam(learning_rate=learning_rate), metrics=['accuracy'])
+    return model
+
+def train_in_memory(data_path: str, training_config: dict):
+    """Trains on dense in-memory matrices; returns (pipeline, accuracy, a sample of the raw test features)."""
+    import mlflow
+    from tensorflow import keras
+    with instrumentation.stage("transform") as stage:
+        artifacts, cache_hit = load_or_preprocess(data_path, training_config)
+        stage.rows = len(artifacts["Xt_train"]) + len(artifacts["Xt_test"])
+    mlflow.log_param("preprocessing_cache_hit", cache_hit)
+    input_shape = artifacts["Xt_train"].shape[1]
+    n_classes = artifacts["y_train"].shape[1]
+
+    def create_model():
+        return build_model(input_shape, n_classes, training_config['hidden_units'], training_config['learning_rate'])
+
+    # The classifier trains on the already-transformed splits; the fitted preprocessor
+    # is then put in front of it so the packaged pipeline still accepts raw features.
+    classifier = keras.wrappers.scikit_learn.KerasClassifier(
+        build_fn=create_model,
+        epochs=training_config['epochs'],
+        batch_size=training_config['batch_size']
+    )
+    with instrumentation.stage("fit", rows=len(artifacts["Xt_train"]) * training_config['epochs']):
+        classifier.fit(artifacts["Xt_train"], artifacts["y_train"])
+    pipeline = Pipeline(steps=[
+        ('preprocessor', artifacts["preprocessor"]),
+        ('classifier', classifier)
+    ])
+    with instrumentation.stage("evaluate", rows=len(artifacts["Xt_test"])):
+        accuracy = classifier.score(artifacts["Xt_test"], artifacts["y_test"])
+    # The test split is already shuffled; copied so the full split is not kept alive
+    return pipeline, accuracy, artifacts["X_test"].iloc[:CHECK_SAMPLE_ROWS].copy()
+
+def train_streaming(data_path: str, training_config: dict):
+    """
+    Trains from a prefetching tf.data pipeline that encodes one batch at a time, so
+    the expanded one-hot matrix never has to fit in memory. Returns the same
+    (pipeline, accuracy, raw test features) as the in-memory path.
+    """
+    from tensorflow import keras
+    from streaming_training import StreamingDataset, fit_streaming_preprocessor, make_tf_dataset
+    dataset = StreamingDataset(data_path, test_size=TEST_SIZE, random_state=training_config['random_state'])
+    with instrumentation.stage("transform"):
+        categories, classes = dataset.scan()
+        preprocessor = fit_streaming_preprocessor(categories, dataset.sample(test=False, max_rows=1000))
+
+    loader = dict(preprocessor=preprocessor, classes=classes, batch_size=training_config['batch_size'], workers=training_config['data_loader_workers'])
+    train_ds = make_tf_dataset(dataset, test=False, **loader)
+    test_ds = make_tf_dataset(dataset, test=True, **loader)
+    input_shape = train_ds.element_spec[0].shape[1]
+
+    def create_model():
+        return build_model(input_shape, len(classes), training_config['hidden_units'], training_config['learning_rate'])
+
+    # Fit the network directly on the input pipeline, then attach it to the wrapper so
+    # packaging and MLflow logging see the same KerasClassifier as the in-memory path.
+    classifier = keras.wrappers.scikit_learn.KerasClassifier(
+        build_fn=create_model,
+        epochs=training_config['epochs'],
+        batch_size=training_config['batch_size']
+    )
+    classifier.model = create_model()
+    # Encoding happens inside the input pipeline, so it is included in the fit time
+    with instrumentation.stage("fit"):
+        classifier.model.fit(train_ds, epochs=training_config['epochs'])
+    classifier.classes_ = np.arange(len(classes))
+    classifier.n_classes_ = len(classes)
+    with instrumentation.stage("evaluate"):
+        _, accuracy = classifier.model.evaluate(test_ds)
+
+    pipeline = Pipeline(steps=[
+        ('preprocessor', preprocessor),
+        ('classifier', classifier)
+    ])
+    return pipeline, accuracy, dataset.sample(test=True, max_rows=CHECK_SAMPLE_ROWS)[FEATURE_COLUMNS]
+
+def train_and_build(config_path: str, data_path: str, bento_tag_output: str, best_params: str = "{}",
+                    step_cache_uri: str = "", image_tag: str = "", upstream_metrics: list = ()):
     with open(config_path) as f:
         config = yaml.safe_load(f)
+    # Hyperparameters chosen by the optional tuning step override params.yaml
+    tuned = json.loads(best_params or "{}")
+    if tuned:
+        print(f"Using tuned hyperparameters: {tuned}")
+        config['training'].update(tuned)
 
-    df = pd.read_csv(data_path)
-    
+    # An unchanged dataset, training/deployment config and image reuse the last run and Bento tag
+    outputs = {"mlflow_run_id": "mlflow_run_id.txt", "bento_tag": bento_tag_output}
+    step_cache = open_step_cache(step_cache_uri, "train-and-package-model")
+    if step_cache:
+        step_key = step_fingerprint(
+            "train-and-package-model", image_tag,
+            data=dataset_fingerprint(data_path),
+            training=config['training'],
+            deployment=config['deployment'],
+            mlflow={"tracking_uri": config['mlflow_tracking_uri'], "experiment": config['mlflow_experiment_name']},
+        )
+        if step_cache.fetch(step_key, outputs):
+            return
+
+    import bentoml
+    import mlflow
     mlflow.set_tracking_uri(config['mlflow_tracking_uri'])
     mlflow.set_experiment(config['mlflow_experiment_name'])
     
     with mlflow.start_run() as run:
         print(f"Starting MLflow Run: {run.info.run_id}")
         mlflow.log_params(config['training'])
+        # Only the batching settings are read by the service; replicas, resources and runner
+        # workers are applied through the Seldon manifest when the model is promoted
+        serving = config['deployment']['serving']
+        batching = {key: serving[key] for key in ("max_batch_size", "max_latency_ms")}
+        mlflow.log_params({f"serving_{k}": v for k, v in batching.items()})
+        mlflow.log_param("serving_runner_workers_per_cpu", serving['runner_workers_per_cpu'])
+
+        if config['training']['mode'] == "streaming":
+            print("Training from a streaming tf.data input pipeline...")
+            pipeline, accuracy, X_check = train_streaming(data_path, config['training'])
+        else:
+            pipeline, accuracy, X_check = train_in_memory(data_path, config['training'])
 
-        X = df.drop(columns=["event_timestamp", "license_id", "LICENSE_STATUS"])
-        y = pd.get_dummies(df["LICENSE_STATUS"])
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=config['training']['random_state'])
-
-        cat_features = X.select_dtypes(include=['object', 'string']).columns.tolist()
-        num_features = X.select_dtypes(include=['number']).columns.tolist()
-
-        preprocessor = ColumnTransformer(transformers=[
-            ('num', 'passthrough', num_features),
-            ('cat', OneHotEncoder(handle_unknown='ignore', sparse=False), cat_features)
-        ])
-        
-        preprocessor.fit(X_train)
-        input_shape = preprocessor.transform(X_train).shape[1]
-
-        def create_model():
-            model = keras.Sequential([
-                layers.InputLayer(input_shape=(input_shape,)),
-                layers.Dense(128, activation="relu"),
-                layers.Dense(64, activation="relu"),
-                layers.Dense(y.shape[1], activation="softmax"),
-            ])
-            model.compile(loss="categorical_crossentropy", optimizer="adam", metrics=['accuracy'])
-            return model
-
-        pipeline = Pipeline(steps=[
-            ('preprocessor', preprocessor),
-            ('classifier', keras.wrappers.scikit_learn.KerasClassifier(build_fn=create_model, epochs=config['training']['epochs']))
-        ])
-        pipeline.fit(X_train, y_train)
-
-        accuracy = pipeline.score(X_test, y_test)
         print(f"Model accuracy: {accuracy:.4f}")
         mlflow.log_metric("accuracy", accuracy)
-        mlflow.sklearn.log_model(sk_model=pipeline, artifact_path="model")
-        
-        print("Packaging model with BentoML...")
-        bento_model = bentoml.sklearn.save_model(
-            name=config['deployment']['model_name'],
-            model=pipeline,
-            signatures={"predict": {"batchable": True, "batch_dim": 0}},
-            metadata={"mlflow_run_id": run.info.run_id, "accuracy": accuracy}
-        )
-        print(f"BentoML model saved: {bento_model.tag}")
-        
+
+        with instrumentation.stage("package"):
+            mlflow.sklearn.log_model(sk_model=pipeline, artifact_path="model")
+
+            print("Packaging model with BentoML...")
+            bento_model = bentoml.sklearn.save_model(
+                name=config['deployment']['model_name'],
+                model=pipeline,
+                signatures={"predict": {"batchable": True, "batch_dim": 0}},
+                metadata={"mlflow_run_id": run.info.run_id, "accuracy": accuracy, "serving": batching}
+            )
+            print(f"BentoML model saved: {bento_model.tag}")
+
+        with instrumentation.stage("export", rows=len(X_check)):
+            print("Exporting TensorFlow-free inference model...")
+            numpy_model = export_numpy_model(pipeline, X_check, atol=config['deployment']['numpy_parity_atol'])
+            numpy_bento_model = bentoml.picklable_model.save_model(
+                name=config['deployment']['numpy_model_name'],
+                model=numpy_model,
+                signatures={"predict": {"batchable": True, "batch_dim": 0}},
+                metadata={
+                    "mlflow_run_id": run.info.run_id,
+                    "accuracy": accuracy,
+                    "source_model": str(bento_model.tag),
+                    "serving": batching
+                }
+            )
+            print(f"BentoML NumPy model saved: {numpy_bento_model.tag}")
+
+        with instrumentation.stage("benchmark"):
+            variant_metrics = benchmark_variants(
+                {"keras": ("sklearn", str(bento_model.tag)), "numpy": ("picklable_model", str(numpy_bento_model.tag))},
+                X_check,
+                batch_size=config['training']['batch_size']
+            )
+        for name, value in sorted(variant_metrics.items()):
+            print(f"  {name}: {value:.4f}")
+        mlflow.log_metrics(variant_metrics)
+
+        # Stage timings of this step and of the upstream data steps, so one run shows
+        # where the whole pipeline spends its time
+        for metrics in upstream_metrics:
+            mlflow.log_metrics(json.loads(metrics))
+        instrumentation.report()
+        instrumentation.log_to_mlflow()
+
         # Write run_id and bento_tag to files for downstream components
         with open("mlflow_run_id.txt", "w") as f:
             f.write(run.info.run_id)
         with open(bento_tag_output, "w") as f:
             f.write(str(bento_model.tag))
 
+    if step_cache:
+        step_cache.store(step_key, outputs)
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", required=True)
     parser.add_argument("--data", required=True)
     parser.add_argument("--bento_tag_output", required=True)
+    parser.add_argument("--best_params", default="{}", help="JSON hyperparameters from the tuning step.")
+    parser.add_argument("--best_params_file", default=None, help="File with the tuning step's JSON hyperparameters; ignored if it does not exist.")
+    parser.add_argument("--step_cache", default="", help="Local directory or s3:// URI of the step cache; empty disables it.")
+    parser.add_argument("--image_tag", default="")
+    parser.add_argument("--upstream_metrics", nargs="*", default=[], help="JSON stage timings of earlier pipeline steps to log with the run.")
     args = parser.parse_args()
-    train_and_build(
-        config_path=args.config,
-        data_path=args.data,
-        bento_tag_output=args.bento_tag_output
-    )
\ No newline at end of file
+    best_params = args.best_params
+    # Absent when the tuning step was skipped
+    if args.best_params_file and Path(args.best_params_file).exists():
+        best_params = Path(args.best_params_file).read_text()
+    with instrumentation.profiled():
+        train_and_build(
+            config_path=args.config,
+            data_path=args.data,
+            bento_tag_output=args.bento_tag_output,
+            best_params=best_params,
+            step_cache_uri=args.step_cache,
+            image_tag=args.image_tag,
+            upstream_metrics=args.upstream_metrics
+        )
\ No newline at end of file
@@ -0,0 +1,187 @@
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import yaml
+from common.dataset import dataset_fingerprint
+from common.step_cache import open_step_cache, step_fingerprint
+
+def _init_worker():
+    # One trial per CPU: keep each worker's TensorFlow on a single thread
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(1)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+def run_trial(task: dict) -> dict:
+    """
+    Trains one trial up to task["target_epochs"], resuming from its checkpoint if it
+    already ran in an earlier rung. Early stopping on validation loss can end it sooner.
+    """
+    from tensorflow import keras
+    from train_and_build_bento import build_model
+
+    data_dir = Path(task["data_dir"])
+    X_train = np.load(data_dir / "X_train.npy", mmap_mode="r")
+    y_train = np.load(data_dir / "y_train.npy", mmap_mode="r")
+    X_val = np.load(data_dir / "X_val.npy", mmap_mode="r")
+    y_val = np.load(data_dir / "y_val.npy", mmap_mode="r")
+
+    params = task["params"]
+    checkpoint = Path(task["checkpoint"])
+    if checkpoint.exists():
+        model = keras.models.load_model(checkpoint)
+    else:
+        keras.utils.set_random_seed(task["seed"])
+        model = build_model(X_train.shape[1], y_train.shape[1], params["hidden_units"], params["learning_rate"])
+
+    early_stopping = keras.callbacks.EarlyStopping(monitor="val_loss", patience=task["patience"], restore_best_weights=True)
+    history = model.fit(
+        X_train, y_train,
+        validation_data=(X_val, y_val),
+        batch_size=params["batch_size"],
+        initial_epoch=task["epochs_done"],
+        epochs=task["target_epochs"],
+        callbacks=[early_stopping],
+        verbose=0,
+    )
+    model.save(checkpoint)
+
+    val_accuracy = history.history.get("val_accuracy", [])
+    best_epoch = int(np.argmax(val_accuracy)) if val_accuracy else 0
+    return {
+        "trial_id": task["trial_id"],
+        "epochs_done": task["epochs_done"] + len(val_accuracy),
+        "stopped_early": early_stopping.stopped_epoch > 0,
+        "val_accuracy": float(max(val_accuracy)) if val_accuracy else task["val_accuracy"],
+        "best_epoch": task["epochs_done"] + best_epoch + 1,
+        "history": {name: [float(v) for v in values] for name, values in history.history.items()},
+    }
+
+def sample_trials(search_space: dict, num_trials: int, seed: int) -> list:
+    """Random sample (without replacement) of the full grid."""
+    names = sorted(search_space)
+    grid = [dict(zip(names, values)) for values in itertools.product(*(search_space[name] for name in names))]
+    random.Random(seed).shuffle(grid)
+    return grid[:num_trials]
+
+def tune(config_path: str, data_path: str, output_path: str, enabled: bool = True,
+         step_cache_uri: str = "", image_tag: str = ""):
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+
+    if not enabled:
+        print("Hyperparameter search disabled; training will use params.yaml.")
+        Path(output_path).write_text("{}")
+        return
+
+    step_cache = open_step_cache(step_cache_uri, "tune-hyperparameters")
+    if step_cache:
+        step_key = step_fingerprint(
+            "tune-hyperparameters", image_tag,
+            data=dataset_fingerprint(data_path), training=config['training'], tuning=config['tuning'],
+        )
+        if step_cache.fetch(step_key, {"best_params": output_path}):
+            return
+
+    import mlflow
+    from sklearn.model_selection import train_test_split
+    from train_and_build_bento import load_or_preprocess
+
+    tuning = config['tuning']
+    training = config['training']
+    artifacts, _ = load_or_preprocess(data_path, training)
+    # Trials are scored on a slice of the training split; the test split stays untouched
+    X_train, X_val, y_train, y_val = train_test_split(
+        artifacts["Xt_train"], artifacts["y_train"].to_numpy(dtype=np.float32),
+        test_size=tuning['validation_fraction'], random_state=training['random_state']
+    )
+
+    mlflow.set_tracking_uri(config['mlflow_tracking_uri'])
+    mlflow.set_experiment(config['mlflow_experiment_name'])
+    client = mlflow.tracking.MlflowClient()
+
+    with tempfile.TemporaryDirectory() as work_dir, mlflow.start_run(run_name="hyperparameter-search"):
+        for name, array in (("X_train", X_train), ("y_train", y_train), ("X_val", X_val), ("y_val", y_val)):
+            np.save(Path(work_dir) / f"{name}.npy", np.ascontiguousarray(array, dtype=np.float32))
+
+        trials = {}
+        for trial_id, params in enumerate(sample_trials(tuning['search_space'], tuning['num_trials'], training['random_state'])):
+            with mlflow.start_run(run_name=f"trial-{trial_id}", nested=True) as trial_run:
+                mlflow.log_params(params)
+            trials[trial_id] = {
+                "trial_id": trial_id, "params": params, "run_id": trial_run.info.run_id,
+                "epochs_done": 0, "val_accuracy": 0.0, "best_epoch": 0, "stopped_early": False,
+            }
+
+        survivors = list(trials)
+        # CPUs this container may actually use (cgroup/affinity), and never more workers than trials
+        workers = max(1, min(len(os.sched_getaffinity(0)), len(trials)))
+        eta = tuning['reduction_factor']
+        rungs = int(math.log(tuning['max_epochs'] / tuning['min_epochs'], eta)) + 1
+        print(f"Searching {len(trials)} trials over {rungs} successive-halving rungs with {workers} workers...")
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as executor:
+            for rung in range(rungs):
+                target_epochs = min(tuning['min_epochs'] * eta ** rung, tuning['max_epochs'])
+                tasks = [
+                    {
+                        **trials[trial_id], "target_epochs": target_epochs, "data_dir": work_dir,
+                        "checkpoint": str(Path(work_dir) / f"trial-{trial_id}"),
+                        "patience": tuning['early_stopping_patience'], "seed": training['random_state'] + trial_id,
+                    }
+                    for trial_id in survivors
+                    if not trials[trial_id]["stopped_early"] and trials[trial_id]["epochs_done"] < target_epochs
+                ]
+                for result in executor.map(run_trial, tasks):
+                    trial = trials[result["trial_id"]]
+                    for name, values in result.pop("history").items():
+                        for offset, value in enumerate(values):
+                            client.log_metric(trial["run_id"], name, value, step=trial["epochs_done"] + offset + 1)
+                    trial.update(result)
+
+                ranked = sorted(survivors, key=lambda trial_id: trials[trial_id]["val_accuracy"], reverse=True)
+                survivors = ranked[:max(1, len(ranked) // eta)] if rung < rungs - 1 else ranked
+                print(f"Rung {rung} ({target_epochs} epochs): best val_accuracy {trials[ranked[0]]['val_accuracy']:.4f}, {len(survivors)} trial(s) kept")
+
+        for trial in trials.values():
+            client.log_metric(trial["run_id"], "best_val_accuracy", trial["val_accuracy"])
+            client.set_terminated(trial["run_id"])
+
+        best = trials[survivors[0]]
+        best_params = {**best["params"], "epochs": best["best_epoch"]}
+        print(f"Best trial {best['trial_id']}: val_accuracy {best['val_accuracy']:.4f} with {best_params}")
+        mlflow.log_metric("best_val_accuracy", best["val_accuracy"])
+        mlflow.log_dict(best_params, "best_params.json")
+        mlflow.set_tag("best_trial_run_id", best["run_id"])
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(best_params, f)
+    if step_cache:
+        step_cache.store(step_key, {"best_params": output_path})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", required=True)
+    parser.add_argument("--data", required=True)
+    parser.add_argument("--best_params_output", required=True)
+    parser.add_argument("--enabled", default="true", choices=["true", "false"])
+    parser.add_argument("--step_cache", default="", help="Local directory or s3:// URI of the step cache; empty disables it.")
+    parser.add_argument("--image_tag", default="")
+    args = parser.parse_args()
+    tune(
+        config_path=args.config,
+        data_path=args.data,
+        output_path=args.best_params_output,
+        enabled=args.enabled == "true",
+        step_cache_uri=args.step_cache,
+        image_tag=args.image_tag
+    )
@@ -0,0 +1,44 @@
+import argparse
+import json
+import resource
+import time
+
+def benchmark_variant(framework: str, model_tag: str, data_path: str, batch_size: int, repeats: int) -> dict:
+    """
+    Loads one saved model variant and times it. Meant to run in a fresh interpreter
+    so the import/load cost and peak RSS reflect only what that variant pulls in.
+    """
+    start = time.perf_counter()
+    import bentoml
+    import numpy as np
+    import pandas as pd
+    if framework == "sklearn":
+        model = bentoml.sklearn.load_model(model_tag)
+    else:
+        model = bentoml.picklable_model.load_model(model_tag)
+    load_seconds = time.perf_counter() - start
+
+    batch = pd.read_parquet(data_path).iloc[:batch_size]
+    model.predict(batch)  # Warm-up call, excluded from the latency figures
+    latencies = []
+    for _ in range(repeats):
+        batch_start = time.perf_counter()
+        model.predict(batch)
+        latencies.append(time.perf_counter() - batch_start)
+
+    return {
+        "import_and_load_seconds": load_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "batch_latency_p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "batch_latency_p95_ms": float(np.percentile(latencies, 95) * 1000),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--framework", required=True, choices=["sklearn", "picklable_model"])
+    parser.add_argument("--model_tag", required=True)
+    parser.add_argument("--data", required=True)
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(benchmark_variant(args.framework, args.model_tag, args.data, args.batch_size, args.repeats)))
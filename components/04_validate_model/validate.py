@@ -1,50 +1,158 @@
 import argparse
-import mlflow
-import pandas as pd
+import json
+import time
+import numpy as np
 import yaml
 from sklearn.metrics import accuracy_score
+from common.dataset import dataset_fingerprint, read_dataset, FEATURE_COLUMNS, LABEL_COLUMN
+from common.instrumentation import Instrumentation, current_rss_mb, peak_rss_mb
+from common.model_cache import ModelArtifactCache
+from common.step_cache import open_step_cache, step_fingerprint
 
-def validate_model(config_path: str, run_id: str, test_data_path: str):
+instrumentation = Instrumentation("validate_model")
+
+def to_label_indices(predictions) -> np.ndarray:
+    """Class indices from either class predictions or per-class probabilities."""
+    predictions = np.asarray(predictions)
+    return predictions.argmax(axis=1) if predictions.ndim == 2 else predictions.astype(int)
+
+def measure_performance(model, X_test, latency_samples: int, batch_size: int, throughput_rows: int) -> dict:
+    """Times single-row inference, and batched inference on the first throughput_rows rows."""
+    single_row = X_test.iloc[:1]
+    model.predict(single_row)  # Warm-up call, excluded from the measurements
+    latencies = []
+    for _ in range(latency_samples):
+        start = time.perf_counter()
+        model.predict(single_row)
+        latencies.append(time.perf_counter() - start)
+
+    X_sample = X_test.iloc[:throughput_rows]
+    start = time.perf_counter()
+    for offset in range(0, len(X_sample), batch_size):
+        model.predict(X_sample.iloc[offset:offset + batch_size])
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "single_row_latency_p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "single_row_latency_p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "batch_throughput_rows_per_sec": len(X_sample) / batch_seconds,
+    }
+
+def validate_model(config_path: str, run_id: str, test_data_path: str, step_cache_uri: str = "", image_tag: str = ""):
     with open(config_path) as f:
         config = yaml.safe_load(f)
+    thresholds = config['model_validation']
+
+    # Only passing runs are cached; the stored verdict holds the metrics logged for the run
+    verdict_path = "validation_verdict.json"
+    step_cache = open_step_cache(step_cache_uri, "validate-model-performance")
+    if step_cache:
+        step_key = step_fingerprint(
+            "validate-model-performance", image_tag,
+            run_id=run_id,
+            test_data=dataset_fingerprint(test_data_path),
+            thresholds=thresholds,
+            baseline_accuracy=config['training']['baseline_accuracy'],
+            batch_size=config['training']['batch_size'],
+        )
+        if step_cache.fetch(step_key, {"verdict": verdict_path}):
+            print("Model validation successful (cached)!")
+            return
 
+    # Imported only on a step-cache miss
+    import mlflow
     mlflow.set_tracking_uri(config['mlflow_tracking_uri'])
-    
+
     print(f"Loading model from run ID: {run_id}")
-    logged_model_uri = f'runs:/{run_id}/model'
-    model = mlflow.sklearn.load_model(logged_model_uri)
+    # The memory gate covers the model plus a bounded sample only, measured before the
+    # test set is read, so it does not grow with the size of the test data
+    rss_before_load_mb = current_rss_mb()
+    model_cache = ModelArtifactCache(config['model_cache']['dir'], max_bytes=config['model_cache']['max_mb'] * 1024 * 1024)
+    download_start = time.perf_counter()
+    local_model_path = model_cache.fetch(run_id, "model")
+    download_seconds = time.perf_counter() - download_start
+    load_start = time.perf_counter()
+    model = mlflow.sklearn.load_model(local_model_path)
+    load_seconds = time.perf_counter() - load_start
+
+    print("Measuring serving performance...")
+    with instrumentation.stage("benchmark") as stage:
+        X_sample = read_dataset(test_data_path, columns=FEATURE_COLUMNS, max_rows=thresholds['throughput_sample_rows'])
+        stage.rows = len(X_sample)
+        performance = measure_performance(
+            model, X_sample,
+            latency_samples=thresholds['latency_samples'],
+            batch_size=config['training']['batch_size'],
+            throughput_rows=thresholds['throughput_sample_rows']
+        )
+    performance["model_rss_mb"] = peak_rss_mb() - rss_before_load_mb
+    performance["model_load_seconds"] = load_seconds
+    performance["model_download_seconds"] = download_seconds
+    del X_sample
 
     print("Loading test data for validation...")
-    test_df = pd.read_csv(test_data_path)
-    X_test = test_df.drop(columns=["event_timestamp", "license_id", "LICENSE_STATUS"])
-    y_test_encoded = pd.get_dummies(test_df['LICENSE_STATUS'])
+    with instrumentation.stage("load") as stage:
+        test_df = read_dataset(test_data_path, columns=FEATURE_COLUMNS + [LABEL_COLUMN])
+        stage.rows = len(test_df)
+    X_test = test_df[FEATURE_COLUMNS]
+    # Same class order as the one-hot targets built with pd.get_dummies at training time
+    _, y_true = np.unique(test_df[LABEL_COLUMN].to_numpy(dtype=str), return_inverse=True)
 
     print("Evaluating model performance...")
-    predictions = model.predict(X_test)
-    
-    # KerasClassifier might return probabilities, need to convert to class labels
-    # If the output of predict is one-hot encoded, we can use argmax
-    predicted_labels = pd.get_dummies(pd.DataFrame(predictions).idxmax(axis=1))
+    with instrumentation.stage("predict", rows=len(X_test)):
+        predicted_labels = to_label_indices(model.predict(X_test))
 
-    accuracy = accuracy_score(y_test_encoded, predicted_labels)
+    accuracy = accuracy_score(y_true, predicted_labels)
     baseline_accuracy = config['training']['baseline_accuracy']
     print(f"Model Accuracy: {accuracy:.4f}")
     print(f"Baseline Accuracy Threshold: {baseline_accuracy:.4f}")
 
+    # Informational only: the process peak includes the full test set
+    performance["peak_rss_mb"] = peak_rss_mb()
+    for name, value in sorted(performance.items()):
+        print(f"  {name}: {value:.4f}")
+
+    with mlflow.start_run(run_id=run_id):
+        mlflow.log_metric("validation_accuracy", accuracy)
+        mlflow.log_metrics({f"validation_{name}": value for name, value in performance.items()})
+        instrumentation.log_to_mlflow()
+
     # --- QUALITY GATE ---
     if accuracy < baseline_accuracy:
         raise ValueError(f"Model validation failed: Accuracy {accuracy:.4f} is below baseline {baseline_accuracy:.4f}.")
 
+    # --- PERFORMANCE GATE ---
+    failures = []
+    if performance["model_load_seconds"] > thresholds['max_load_seconds']:
+        failures.append(f"load time {performance['model_load_seconds']:.2f}s > {thresholds['max_load_seconds']}s")
+    if performance["single_row_latency_p95_ms"] > thresholds['max_single_row_latency_ms']:
+        failures.append(f"single-row p95 latency {performance['single_row_latency_p95_ms']:.2f}ms > {thresholds['max_single_row_latency_ms']}ms")
+    if performance["batch_throughput_rows_per_sec"] < thresholds['min_batch_throughput_rows_per_sec']:
+        failures.append(f"batch throughput {performance['batch_throughput_rows_per_sec']:.0f} rows/s < {thresholds['min_batch_throughput_rows_per_sec']} rows/s")
+    if performance["model_rss_mb"] > thresholds['max_model_rss_mb']:
+        failures.append(f"model RSS {performance['model_rss_mb']:.0f}MB > {thresholds['max_model_rss_mb']}MB")
+    if failures:
+        raise ValueError("Model validation failed: " + "; ".join(failures) + ".")
+
     print("Model validation successful!")
+    if step_cache:
+        with open(verdict_path, "w") as f:
+            json.dump({"run_id": run_id, "validation_accuracy": accuracy, **performance}, f)
+        step_cache.store(step_key, {"verdict": verdict_path})
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", required=True)
     parser.add_argument("--run_id", required=True)
     parser.add_argument("--test_data", required=True)
+    parser.add_argument("--step_cache", default="", help="Local directory or s3:// URI of the step cache; empty disables it.")
+    parser.add_argument("--image_tag", default="")
     args = parser.parse_args()
-    validate_model(
-        config_path=args.config,
-        run_id=args.run_id,
-        test_data_path=args.test_data,
-    )
\ No newline at end of file
+    with instrumentation.profiled():
+        validate_model(
+            config_path=args.config,
+            run_id=args.run_id,
+            test_data_path=args.test_data,
+            step_cache_uri=args.step_cache,
+            image_tag=args.image_tag
+        )
@@ -0,0 +1,108 @@
+import random
+import shutil
+import time
+from pathlib import Path
+from git import GitCommandError, Repo
+
+DEPLOYMENTS_DIR = "deployments"
+
+def render_manifest(template: str, deployment_name: str, namespace: str, bento_image: str, model_tag: str, serving: dict) -> str:
+    """Fills the Seldon template placeholders for one model deployment."""
+    resources = serving['resources']
+    replacements = {
+        "__DEPLOYMENT_NAME__": deployment_name,
+        "__NAMESPACE__": namespace,
+        "__BENTO_IMAGE__": bento_image,
+        # Pinned model tag, so replicas don't resolve "latest" in the model store at startup
+        "__MODEL_TAG__": model_tag,
+        "__REPLICAS__": serving['replicas'],
+        "__MAX_BATCH_SIZE__": serving['max_batch_size'],
+        "__MAX_LATENCY_MS__": serving['max_latency_ms'],
+        "__RUNNER_WORKERS_PER_CPU__": serving['runner_workers_per_cpu'],
+        "__CPU_REQUEST__": resources['requests']['cpu'],
+        "__MEMORY_REQUEST__": resources['requests']['memory'],
+        "__CPU_LIMIT__": resources['limits']['cpu'],
+        "__MEMORY_LIMIT__": resources['limits']['memory'],
+    }
+    manifest = template
+    for placeholder, value in replacements.items():
+        manifest = manifest.replace(placeholder, str(value))
+    return manifest
+
+class ManifestRepo:
+    """
+    Persistent shallow, sparse working copy of the GitOps manifest repository. The
+    first use clones only the tip of the branch and the deployments/ directory;
+    later uses fetch the new tip instead of cloning again. A batch of manifests is
+    published as one commit. When the push is rejected because another promotion
+    landed first, the batch is re-applied on top of the new tip and pushed again.
+    """
+
+    def __init__(self, url: str, work_dir: str, branch: str = "main", sparse_paths: tuple = (DEPLOYMENTS_DIR,),
+                 author_name: str = "mlops-pipeline", author_email: str = "mlops-pipeline@localhost"):
+        self.url = url
+        self.work_dir = Path(work_dir)
+        self.branch = branch
+        self.sparse_paths = list(sparse_paths)
+        # Explicit identity: the step image has no git config to fall back on
+        self.identity = {
+            "GIT_AUTHOR_NAME": author_name, "GIT_AUTHOR_EMAIL": author_email,
+            "GIT_COMMITTER_NAME": author_name, "GIT_COMMITTER_EMAIL": author_email,
+        }
+        self.repo = None
+
+    def sync(self):
+        """Brings the working copy to the remote tip, discarding any local state."""
+        if self.repo is None and (self.work_dir / ".git").exists():
+            self.repo = Repo(self.work_dir)
+            if self.repo.remotes.origin.url != self.url:
+                print(f"Working copy at {self.work_dir} tracks another repository, cloning again...")
+                shutil.rmtree(self.work_dir)
+                self.repo = None
+
+        if self.repo is None:
+            print(f"Cloning manifest repository (shallow, sparse: {', '.join(self.sparse_paths)})...")
+            self.work_dir.parent.mkdir(parents=True, exist_ok=True)
+            self.repo = Repo.clone_from(
+                self.url, self.work_dir, depth=1, branch=self.branch,
+                multi_options=["--filter=blob:none", "--sparse"]
+            )
+            self.repo.git.sparse_checkout("set", *self.sparse_paths)
+            return
+
+        self.repo.git.fetch("--depth", "1", "origin", self.branch)
+        self.repo.git.reset("--hard", "FETCH_HEAD")
+        self.repo.git.clean("-fd")
+
+    def publish(self, files: dict, message: str, max_attempts: int = 5):
+        """
+        Writes {relative path: content} and pushes them as a single commit. Returns the
+        commit SHA, or None when the manifests already match the remote.
+        """
+        for attempt in range(1, max_attempts + 1):
+            self.sync()
+            for relative_path, content in files.items():
+                path = self.work_dir / relative_path
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(content)
+            self.repo.git.add("--", *files)
+            # Through the git CLI: GitPython can't read the extended index a sparse checkout writes
+            if not self.repo.git.diff("--cached", "--name-only"):
+                print("Manifests are already up to date; nothing to push.")
+                return None
+
+            with self.repo.git.custom_environment(**self.identity):
+                self.repo.git.commit("-m", message)
+            commit = self.repo.head.commit
+            try:
+                self.repo.git.push("origin", f"HEAD:refs/heads/{self.branch}")
+                print(f"Pushed {commit.hexsha[:12]} with {len(files)} manifest(s) on attempt {attempt}.")
+                return commit.hexsha
+            except GitCommandError:
+                if attempt == max_attempts:
+                    raise
+                # Most likely a concurrent promotion moved the branch. A shallow clone can't rebase
+                # reliably, so back off, then re-apply the batch on top of the new tip
+                delay = random.uniform(0, min(2 ** attempt, 30))
+                print(f"Push rejected on attempt {attempt}; retrying on the new tip in {delay:.1f}s...")
+                time.sleep(delay)
@@ -1,20 +1,12 @@
 import argparse
+import json
 import mlflow
 import yaml
-from git import Repo
-import tempfile
-import os
+from gitops import DEPLOYMENTS_DIR, ManifestRepo, render_manifest
 
-def promote_and_trigger(config_path: str, run_id: str, model_stage: str, bento_tag: str):
-    with open(config_path) as f:
-        config = yaml.safe_load(f)
-
-    model_name = config['deployment']['model_name']
-    mlflow_uri = config['mlflow_tracking_uri']
-    mlflow.set_tracking_uri(mlflow_uri)
-    client = mlflow.tracking.MlflowClient()
-
-    print(f"Promoting model from run '{run_id}' to stage '{model_stage}'...")
+def register_promotion(client, model_name: str, run_id: str, model_stage: str) -> str:
+    """Registers the run's model and moves the new version to the given stage."""
+    print(f"Promoting {model_name} from run '{run_id}' to stage '{model_stage}'...")
     model_version = client.create_model_version(
         name=model_name,
         source=f"runs:/{run_id}/model",
@@ -27,50 +19,86 @@ def promote_and_trigger(config_path: str, run_id: str, model_stage: str, bento_t
         archive_existing_versions=True
     )
     print(f"Successfully promoted model version {model_version.version} to '{model_stage}'.")
+    return model_version.version
 
-    with tempfile.TemporaryDirectory() as repo_dir:
-        print(f"Cloning manifest repository...")
-        manifest_repo_ssh_url = config['deployment']['gitops_manifest_repo_ssh_url']
-        # The container needs an SSH key mounted to authenticate
-        Repo.clone_from(manifest_repo_ssh_url, repo_dir)
-        repo = Repo(repo_dir)
+def promote_batch(config_path: str, promotions: list, template_path: str, work_dir: str = None):
+    """
+    Promotes several models and/or stages at once: every entry is registered in
+    MLflow, then all rendered manifests are pushed to the GitOps repo in one commit.
+    Each entry holds run_id, stage and bento_tag, plus optional model_name and
+    serving overrides (e.g. {"replicas": 3}) on top of deployment.serving.
+    """
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    deployment = config['deployment']
 
-        namespace = f"{'prod' if model_stage == 'Production' else 'staging'}-models"
-        deployment_dir = os.path.join(repo_dir, "deployments", 'production' if model_stage == 'Production' else 'staging')
-        os.makedirs(deployment_dir, exist_ok=True)
-        deployment_yaml_path = os.path.join(deployment_dir, f"{model_name.lower()}.yaml")
-        
-        with open("/app/k8s/seldon-deployment-template.yaml") as f:
-            template = f.read()
+    mlflow.set_tracking_uri(config['mlflow_tracking_uri'])
+    client = mlflow.tracking.MlflowClient()
+
+    with open(template_path) as f:
+        template = f.read()
+
+    files, summary = {}, []
+    for promotion in promotions:
+        model_name = promotion.get('model_name', deployment['model_name'])
+        model_stage = promotion['stage']
+        bento_tag = promotion['bento_tag']
+        version = register_promotion(client, model_name, promotion['run_id'], model_stage)
 
-        deployment_name = f"{model_name.lower()}-{model_stage.lower()}"
-        bento_image = f"{config['docker_registry']}/{config['deployment']['bento_service_name']}:{bento_tag}"
-        
-        manifest = template.replace("__DEPLOYMENT_NAME__", deployment_name)
-        manifest = manifest.replace("__NAMESPACE__", namespace)
-        manifest = manifest.replace("__BENTO_IMAGE__", bento_image)
+        is_production = model_stage == 'Production'
+        serving = {**deployment['serving'], **promotion.get('serving', {})}
+        manifest = render_manifest(
+            template,
+            deployment_name=f"{model_name.lower()}-{model_stage.lower()}",
+            namespace=f"{'prod' if is_production else 'staging'}-models",
+            bento_image=f"{config['docker_registry']}/{deployment['bento_service_name']}:{bento_tag}",
+            model_tag=bento_tag,
+            serving=serving,
+        )
+        path = f"{DEPLOYMENTS_DIR}/{'production' if is_production else 'staging'}/{model_name.lower()}.yaml"
+        files[path] = manifest
+        summary.append(f"{model_name} {model_stage} -> version {version} (Bento: {bento_tag})")
 
-        with open(deployment_yaml_path, 'w') as f:
-            f.write(manifest)
+    if len(summary) == 1:
+        commit_message = f"Update {summary[0]}"
+    else:
+        commit_message = f"Promote {len(summary)} model deployments\n\n" + "\n".join(f"- {line}" for line in summary)
 
-        print("Committing and pushing updated manifest to GitOps repo...")
-        repo.index.add([deployment_yaml_path])
-        commit_message = f"Update {model_stage} deployment for {model_name} to version {model_version.version} (Bento: {bento_tag})"
-        repo.index.commit(commit_message)
-        origin = repo.remote(name='origin')
-        origin.push()
-        print("GitOps trigger complete.")
+    print(f"Committing and pushing {len(files)} manifest(s) to the GitOps repo...")
+    manifest_repo = ManifestRepo(
+        deployment['gitops_manifest_repo_ssh_url'],
+        work_dir or deployment['gitops_workdir'],
+        branch=deployment['gitops_branch'],
+        author_name=deployment['gitops_author_name'],
+        author_email=deployment['gitops_author_email'],
+    )
+    manifest_repo.publish(files, commit_message, max_attempts=deployment['gitops_push_attempts'])
+    print("GitOps trigger complete.")
+
+def promote_and_trigger(config_path: str, run_id: str, model_stage: str, bento_tag: str,
+                        template_path: str = "/app/k8s/seldon-deployment-template.yaml", work_dir: str = None):
+    promote_batch(config_path, [{"run_id": run_id, "stage": model_stage, "bento_tag": bento_tag}], template_path, work_dir)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", required=True)
-    parser.add_argument("--run_id", required=True)
-    parser.add_argument("--stage", required=True)
-    parser.add_argument("--bento_tag", required=True)
+    parser.add_argument("--run_id")
+    parser.add_argument("--stage")
+    parser.add_argument("--bento_tag")
+    parser.add_argument("--promotions", help="JSON file with a list of promotions to publish in one commit, instead of --run_id/--stage/--bento_tag.")
+    parser.add_argument("--template", default="/app/k8s/seldon-deployment-template.yaml")
+    parser.add_argument("--workdir", default=None, help="Persistent manifest working copy; defaults to deployment.gitops_workdir.")
     args = parser.parse_args()
-    promote_and_trigger(
+    if args.promotions:
+        with open(args.promotions) as f:
+            promotions = json.load(f)
+    elif args.run_id and args.stage and args.bento_tag:
+        promotions = [{"run_id": args.run_id, "stage": args.stage, "bento_tag": args.bento_tag}]
+    else:
+        parser.error("either --promotions or all of --run_id, --stage and --bento_tag are required")
+    promote_batch(
         config_path=args.config,
-        run_id=args.run_id,
-        model_stage=args.stage,
-        bento_tag=args.bento_tag
-    )
\ No newline at end of file
+        promotions=promotions,
+        template_path=args.template,
+        work_dir=args.workdir
+    )
@@ -0,0 +1,228 @@
+import argparse
+import json
+import os
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import yaml
+from common.dataset import FEATURE_COLUMNS
+from common.model_cache import ModelArtifactCache, resolve_run_artifact
+
+ID_COLUMNS = ["license_id", "event_timestamp"]
+CHECKPOINT_DIR = "_checkpoint"
+
+# Loaded once per worker process by _init_worker
+_model = None
+_predict_kwargs = {}
+
+def load_model(model_uri: str, framework: str):
+    """The sklearn pipeline logged to MLflow (a URI or local copy), or a saved Bento model by tag."""
+    if framework == "mlflow":
+        import mlflow.sklearn
+        return mlflow.sklearn.load_model(model_uri)
+    import bentoml
+    if framework == "sklearn":
+        return bentoml.sklearn.load_model(model_uri)
+    return bentoml.picklable_model.load_model(model_uri)
+
+def _init_worker(model_uri: str, framework: str, tracking_uri: str, batch_size: int):
+    global _model, _predict_kwargs
+    if framework != "picklable_model":
+        # The Keras pipeline predicts in batches of 32 rows unless told otherwise
+        _predict_kwargs = {"batch_size": batch_size}
+        # One worker per CPU: keep each worker's TensorFlow on a single thread
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(1)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    import mlflow
+    mlflow.set_tracking_uri(tracking_uri)
+    _model = load_model(model_uri, framework)
+
+def resolve_feast_source(feast_repo_path: str) -> str:
+    """Path of the offline source behind the license feature view."""
+    from feast import FeatureStore
+    source = Path(FeatureStore(repo_path=feast_repo_path).get_batch_source("license_features_view").path)
+    if not source.is_absolute() and not source.exists():
+        source = Path(feast_repo_path).parent / source
+    return str(source)
+
+def iter_units(input_path: str, chunk_size: int):
+    """
+    Yields (unit_id, work) in a fixed order. Parquet inputs (a file or a directory of
+    parts) are split by row group and read inside the workers; CSV inputs are read
+    here in chunks of chunk_size rows.
+    """
+    path = Path(input_path)
+    if path.is_dir() or path.suffix.lower() == ".parquet":
+        files = sorted(path.rglob("*.parquet")) if path.is_dir() else [path]
+        unit_id = 0
+        for data_file in files:
+            for row_group in range(pq.ParquetFile(data_file).num_row_groups):
+                yield unit_id, {"file": str(data_file), "row_group": row_group}
+                unit_id += 1
+    else:
+        columns = pd.read_csv(path, nrows=0).columns
+        usecols = [col for col in ID_COLUMNS + FEATURE_COLUMNS if col in columns]
+        for unit_id, chunk in enumerate(pd.read_csv(path, usecols=usecols, chunksize=chunk_size, low_memory=False)):
+            yield unit_id, {"frame": chunk}
+
+def _read_unit(work: dict) -> pd.DataFrame:
+    if "frame" in work:
+        return work["frame"]
+    parquet_file = pq.ParquetFile(work["file"])
+    columns = [col for col in ID_COLUMNS + FEATURE_COLUMNS if col in parquet_file.schema_arrow.names]
+    return parquet_file.read_row_group(work["row_group"], columns=columns).to_pandas()
+
+def score_unit(unit_id: int, work: dict, output_dir: str) -> int:
+    """Scores one unit in a single vectorized call and writes its rows into the year partitions."""
+    df = _read_unit(work)
+    probabilities = np.asarray(_model.predict_proba(df[FEATURE_COLUMNS], **_predict_kwargs))
+
+    predictions = df[[col for col in ID_COLUMNS if col in df.columns]].reset_index(drop=True)
+    predictions["prediction"] = probabilities.argmax(axis=1)
+    predictions["prediction_probability"] = probabilities.max(axis=1)
+
+    if "event_timestamp" in predictions.columns:
+        partitions = predictions.groupby(pd.to_datetime(predictions["event_timestamp"], utc=True).dt.year)
+        partitions = [(f"event_year={year}", rows) for year, rows in partitions]
+    else:
+        partitions = [("event_year=unknown", predictions)]
+    for partition, rows in partitions:
+        partition_dir = Path(output_dir) / partition
+        partition_dir.mkdir(parents=True, exist_ok=True)
+        # Deterministic part names: a unit that is rerun after a crash overwrites its own files
+        tmp_path = partition_dir / f".part-{unit_id:06d}.tmp"
+        rows.to_parquet(tmp_path, index=False)
+        tmp_path.replace(partition_dir / f"part-{unit_id:06d}.parquet")
+    return len(df)
+
+def _job_fingerprint(input_path: str, requested_model: str, framework: str) -> dict:
+    inputs = sorted(Path(input_path).rglob("*.parquet")) if Path(input_path).is_dir() else [Path(input_path)]
+    return {
+        "requested_model": requested_model,
+        "framework": framework,
+        "inputs": {str(path): [path.stat().st_size, path.stat().st_mtime_ns] for path in inputs},
+    }
+
+def pin_model_version(model_name: str, stage: str) -> str:
+    """models:/<name>/<version> of the version currently in the stage."""
+    import mlflow
+    versions = mlflow.tracking.MlflowClient().get_latest_versions(model_name, stages=[stage])
+    if not versions:
+        raise ValueError(f"No version of {model_name} is in stage '{stage}'.")
+    return f"models:/{model_name}/{versions[0].version}"
+
+def batch_score(config_path: str, input_path: str, output_dir: str, model_uri: str = None, framework: str = "mlflow",
+                model_stage: str = "Production", chunk_size: int = 250_000, batch_size: int = 4096,
+                workers: int = 1, restart: bool = False):
+    """
+    Scores a whole dataset with the promoted model across a process pool. Finished
+    units are recorded under <output>/_checkpoint, so rerunning the same job resumes
+    after the last completed unit instead of starting over.
+    """
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    if model_uri is None and framework != "mlflow":
+        raise ValueError(f"--model (a Bento model tag) is required with --framework {framework}; stages are resolved for mlflow only.")
+    requested_model = model_uri or f"models:/{config['deployment']['model_name']}/{model_stage}"
+    stage_uri = requested_model.startswith("models:/") and not requested_model.rsplit("/", 1)[1].isdigit()
+    if stage_uri and framework != "mlflow":
+        raise ValueError(f"Model registry URIs need --framework mlflow, got {framework}.")
+
+    output_root = Path(output_dir)
+    checkpoint_dir = output_root / CHECKPOINT_DIR
+    job = _job_fingerprint(input_path, requested_model, framework)
+    if restart:
+        shutil.rmtree(output_root, ignore_errors=True)
+    previous_job = None
+    if (checkpoint_dir / "job.json").exists():
+        with open(checkpoint_dir / "job.json") as f:
+            previous_job = json.load(f)
+        if {k: v for k, v in previous_job.items() if k != "model_uri"} != job:
+            raise ValueError(f"{output_dir} holds a checkpoint for a different model or input. Use --restart or a new output directory.")
+
+    if previous_job is not None:
+        # Keep the version pinned when the job started, even if the stage has moved since
+        model_uri = previous_job["model_uri"]
+    elif stage_uri:
+        import mlflow
+        mlflow.set_tracking_uri(config['mlflow_tracking_uri'])
+        name, stage = requested_model[len("models:/"):].rsplit("/", 1)
+        model_uri = pin_model_version(name, stage)
+    else:
+        model_uri = requested_model
+    job["model_uri"] = model_uri
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    with open(checkpoint_dir / "job.json", "w") as f:
+        json.dump(job, f)
+    (output_root / "_SUCCESS").unlink(missing_ok=True)
+
+    done = {int(path.stem) for path in checkpoint_dir.glob("*.done")}
+    if done:
+        print(f"Resuming: {len(done)} unit(s) already scored")
+
+    worker_model_uri = model_uri
+    if framework == "mlflow":
+        # Download once into the shared artifact cache; every worker then loads the local copy
+        import mlflow
+        mlflow.set_tracking_uri(config['mlflow_tracking_uri'])
+        model_cache = ModelArtifactCache(config['model_cache']['dir'], max_bytes=config['model_cache']['max_mb'] * 1024 * 1024)
+        worker_model_uri = model_cache.fetch(*resolve_run_artifact(model_uri))
+
+    print(f"Scoring {input_path} with {model_uri} ({framework}) using {workers} worker(s)...")
+    total_rows = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(worker_model_uri, framework, config['mlflow_tracking_uri'], batch_size)) as executor:
+        pending = deque()
+
+        def finish_oldest():
+            unit_id, future = pending.popleft()
+            rows = future.result()
+            (checkpoint_dir / f"{unit_id:06d}.done").touch()
+            return rows
+
+        for unit_id, work in iter_units(input_path, chunk_size):
+            if unit_id in done:
+                continue
+            pending.append((unit_id, executor.submit(score_unit, unit_id, work, str(output_root))))
+            # At most two units per worker in flight, so memory stays flat regardless of input size
+            if len(pending) >= 2 * workers:
+                total_rows += finish_oldest()
+        while pending:
+            total_rows += finish_oldest()
+
+    (output_root / "_SUCCESS").touch()
+    print(f"Scored {total_rows} rows; predictions written to {output_root}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--data", help="Parquet file, directory of Parquet parts, or CSV to score.")
+    source.add_argument("--feast_repo", help="Score the offline source of the Feast feature view.")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--model", default=None, help="runs:/<id>/model, models:/<name>/<version or stage> (pinned to a version at job start), or a Bento model tag. "
+                        "Defaults to the model in --stage; required for the Bento frameworks.")
+    parser.add_argument("--framework", default="mlflow", choices=["mlflow", "sklearn", "picklable_model"])
+    parser.add_argument("--stage", default="Production")
+    parser.add_argument("--chunk_size", type=int, default=250_000, help="Rows per unit for CSV inputs; Parquet inputs use their row groups.")
+    parser.add_argument("--batch_size", type=int, default=4096, help="Keras predict batch size within a unit.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--restart", action="store_true", help="Discard any checkpoint and score everything again.")
+    args = parser.parse_args()
+    batch_score(
+        config_path=args.config,
+        input_path=args.data or resolve_feast_source(args.feast_repo),
+        output_dir=args.output,
+        model_uri=args.model or None,
+        framework=args.framework,
+        model_stage=args.stage,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        restart=args.restart
+    )
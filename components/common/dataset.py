@@ -0,0 +1,61 @@
+import hashlib
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+
+# --- Training dataset contract ---
+# Every pipeline step exchanges the training set as a Parquet file with this schema,
+# so readers get typed columns back without re-running dtype inference on text.
+ENTITY_COLUMNS = ["event_timestamp", "license_id"]
+LABEL_COLUMN = "LICENSE_STATUS"
+FEATURE_COLUMNS = ["SSA", "APPLICATION_TYPE", "BUSINESS_TYPE"]
+NON_FEATURE_COLUMNS = ENTITY_COLUMNS + [LABEL_COLUMN]
+# Bounded row groups let streaming readers load the file one slice at a time
+ROW_GROUP_SIZE = 100_000
+
+TRAINING_SCHEMA = pa.schema([
+    pa.field("event_timestamp", pa.timestamp("us", tz="UTC")),
+    pa.field("license_id", pa.int64()),
+    pa.field("LICENSE_STATUS", pa.string()),
+    pa.field("SSA", pa.float64()),
+    pa.field("APPLICATION_TYPE", pa.string()),
+    pa.field("BUSINESS_TYPE", pa.string()),
+])
+
+def dataset_fingerprint(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a dataset file's content, used as a cache key across runs."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def to_table(df: pd.DataFrame, schema: pa.Schema = TRAINING_SCHEMA) -> pa.Table:
+    """Coerces a dataframe to the dataset schema and returns it as an Arrow table."""
+    missing = [name for name in schema.names if name not in df.columns]
+    if missing:
+        raise ValueError(f"Dataset is missing required columns: {missing}")
+
+    df = df[schema.names].copy()
+    for field in schema:
+        if pa.types.is_timestamp(field.type):
+            df[field.name] = pd.to_datetime(df[field.name], utc=True)
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+def write_dataset(df: pd.DataFrame, path: str, schema: pa.Schema = TRAINING_SCHEMA):
+    """Writes a dataframe as a typed Parquet file."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(to_table(df, schema), path, compression="snappy", row_group_size=ROW_GROUP_SIZE)
+
+def read_dataset(path: str, columns: list = None, max_rows: int = None) -> pd.DataFrame:
+    """
+    Loads a dataset, reading only the requested columns (and, with max_rows, only
+    the first rows). Parquet files are memory-mapped; legacy CSV inputs are still accepted.
+    """
+    if Path(path).suffix.lower() == ".csv":
+        return pd.read_csv(path, usecols=columns, nrows=max_rows, low_memory=False)
+    if max_rows is not None:
+        batches = pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=max_rows, columns=columns)
+        return pa.Table.from_batches([next(batches)]).to_pandas()
+    return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
@@ -0,0 +1,145 @@
+import json
+import os
+import resource
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# INSTRUMENTATION_PROFILE=cprofile writes a pstats file (snakeviz, pstats); =py-spy attaches
+# a py-spy sampler to the process and writes a speedscope profile. Unset disables profiling.
+PROFILE_MODE_ENV = "INSTRUMENTATION_PROFILE"
+PROFILE_DIR_ENV = "INSTRUMENTATION_PROFILE_DIR"
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def current_rss_mb() -> float:
+    """Resident set size right now (Linux /proc), unlike peak_rss_mb which never goes down."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+class Stage:
+    """Handle yielded by Instrumentation.stage; set rows once the stage knows how many it processed."""
+
+    def __init__(self, rows: int = None):
+        self.rows = rows
+
+class Instrumentation:
+    """
+    Times named stages of a component and aggregates them per stage (calls, total
+    seconds, rows, process peak RSS at stage end), so long-running services can
+    time every request without keeping per-call records. Results go to MLflow, a
+    JSON file, or Prometheus histograms for the Bento service.
+    """
+
+    def __init__(self, component: str, prometheus: bool = False):
+        self.component = component
+        self.started = time.perf_counter()
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._pyspy = None
+        self._prometheus = None
+        if prometheus:
+            from prometheus_client import Counter, Histogram
+            self._prometheus = (
+                Histogram(f"{component}_stage_seconds", "Wall time per instrumented stage", ["stage"],
+                          buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)),
+                Counter(f"{component}_stage_rows", "Rows processed per instrumented stage", ["stage"]),
+            )
+
+    @contextmanager
+    def stage(self, name: str, rows: int = None):
+        handle = Stage(rows)
+        start = time.perf_counter()
+        try:
+            yield handle
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                stats = self._stages.setdefault(name, {"calls": 0, "seconds": 0.0, "rows": 0})
+                stats["calls"] += 1
+                stats["seconds"] += seconds
+                stats["rows"] += handle.rows or 0
+                stats["peak_rss_mb"] = peak_rss_mb()
+            if self._prometheus is not None:
+                self._prometheus[0].labels(stage=name).observe(seconds)
+                if handle.rows:
+                    self._prometheus[1].labels(stage=name).inc(handle.rows)
+
+    def metrics(self) -> dict:
+        """Flat {"<component>.<stage>_seconds": ..., ...} mapping, ready for mlflow.log_metrics."""
+        metrics = {}
+        with self._lock:
+            for name, stats in self._stages.items():
+                prefix = f"{self.component}.{name}"
+                metrics[f"{prefix}_seconds"] = stats["seconds"]
+                metrics[f"{prefix}_peak_rss_mb"] = stats["peak_rss_mb"]
+                if stats["rows"]:
+                    metrics[f"{prefix}_rows"] = stats["rows"]
+                    metrics[f"{prefix}_rows_per_sec"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+        metrics[f"{self.component}.total_seconds"] = time.perf_counter() - self.started
+        metrics[f"{self.component}.peak_rss_mb"] = peak_rss_mb()
+        return metrics
+
+    def report(self):
+        for name, value in sorted(self.metrics().items()):
+            print(f"  {name}: {value:.4f}")
+
+    def log_to_mlflow(self):
+        """Logs the stage metrics to the active MLflow run."""
+        import mlflow
+        mlflow.log_metrics(self.metrics())
+
+    def write_json(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.metrics(), f)
+
+    def start_profiling(self):
+        """Starts the profiler selected by INSTRUMENTATION_PROFILE, if any."""
+        mode = os.getenv(PROFILE_MODE_ENV, "")
+        profile_dir = Path(os.getenv(PROFILE_DIR_ENV, "profiles"))
+        if mode == "cprofile":
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif mode == "py-spy":
+            if shutil.which("py-spy") is None:
+                print("WARNING: INSTRUMENTATION_PROFILE=py-spy but py-spy is not installed. Skipping profiling.")
+                return
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            output = profile_dir / f"{self.component}-{os.getpid()}.speedscope.json"
+            self._pyspy = subprocess.Popen(["py-spy", "record", "--pid", str(os.getpid()), "--format", "speedscope", "--output", str(output)])
+
+    def stop_profiling(self):
+        profile_dir = Path(os.getenv(PROFILE_DIR_ENV, "profiles"))
+        if self._profiler is not None:
+            self._profiler.disable()
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            output = profile_dir / f"{self.component}-{os.getpid()}.prof"
+            self._profiler.dump_stats(output)
+            self._profiler = None
+            print(f"cProfile stats written to {output}")
+        if self._pyspy is not None:
+            # py-spy writes its output when interrupted
+            self._pyspy.send_signal(signal.SIGINT)
+            self._pyspy.wait(timeout=30)
+            self._pyspy = None
+
+    @contextmanager
+    def profiled(self):
+        """Profiles the enclosed block when INSTRUMENTATION_PROFILE is set."""
+        self.start_profiling()
+        try:
+            yield
+        finally:
+            self.stop_profiling()
@@ -0,0 +1,73 @@
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+def resolve_run_artifact(model_uri: str) -> tuple:
+    """
+    (run_id, artifact_path) behind a runs:/<run_id>/<path> or models:/<name>/<version>
+    URI. A models:/<name>/<stage> URI resolves to the version in that stage right now.
+    """
+    from mlflow.tracking import MlflowClient
+    if model_uri.startswith("models:/"):
+        name, version = model_uri[len("models:/"):].split("/", 1)
+        if version.isdigit():
+            model_version = MlflowClient().get_model_version(name, version)
+        else:
+            versions = MlflowClient().get_latest_versions(name, stages=[version])
+            if not versions:
+                raise ValueError(f"No version of {name} is in stage '{version}'.")
+            model_version = versions[0]
+        source = model_version.source
+        if not source.startswith("runs:/"):
+            return model_version.run_id, "model"
+        model_uri = source
+    if not model_uri.startswith("runs:/"):
+        raise ValueError(f"Cannot resolve a run for model URI {model_uri}")
+    run_id, _, artifact_path = model_uri[len("runs:/"):].partition("/")
+    return run_id, artifact_path or "model"
+
+class ModelArtifactCache:
+    """
+    On-disk cache of MLflow run artifacts keyed by run ID. Run artifacts never change
+    once logged, so an entry stays valid until it is evicted, least-recently-used
+    first, once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def fetch(self, run_id: str, artifact_path: str = "model") -> str:
+        """Local path of the run's artifact, downloading it from the tracking server on a miss."""
+        entry = self.cache_dir / run_id / artifact_path.replace("/", "__")
+        if (entry / "complete").exists():
+            print(f"Model artifact cache hit for run {run_id}")
+            os.utime(entry)  # Marks the entry as recently used
+            return str(entry / Path(artifact_path).name)
+
+        from mlflow.tracking import MlflowClient
+        print(f"Model artifact cache miss for run {run_id}, downloading '{artifact_path}'...")
+        tmp_entry = self.cache_dir / f".{run_id}-{uuid.uuid4().hex[:8]}.tmp"
+        tmp_entry.mkdir(parents=True)
+        MlflowClient().download_artifacts(run_id, artifact_path, str(tmp_entry))
+        (tmp_entry / "complete").touch()
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        shutil.rmtree(entry, ignore_errors=True)
+        tmp_entry.rename(entry)
+        self.evict(keep=entry)
+        return str(entry / Path(artifact_path).name)
+
+    def evict(self, keep: Path = None):
+        entries = [p for run_dir in self.cache_dir.iterdir() if run_dir.is_dir() and not run_dir.name.startswith(".")
+                   for p in run_dir.iterdir() if p.is_dir()]
+        sizes = {p: sum(f.stat().st_size for f in p.rglob("*") if f.is_file()) for p in entries}
+        total = sum(sizes.values())
+        for entry in sorted(entries, key=lambda p: p.stat().st_mtime):
+            if total <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            print(f"Evicting model artifact cache entry {entry.parent.name}/{entry.name}")
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= sizes[entry]
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+def step_fingerprint(step: str, image_tag: str, **inputs) -> str:
+    """Content address of a step run: its name, component image tag and every input that changes its outputs."""
+    payload = json.dumps({"step": step, "image_tag": image_tag, **inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class StepCache:
+    """
+    Content-addressed cache of a pipeline step's output files, stored under
+    <uri>/<step>/<fingerprint>/. The uri is a local (e.g. volume-mounted) directory
+    or an s3://bucket/prefix location; S3 access goes through boto3 and honours
+    MLFLOW_S3_ENDPOINT_URL, so the MinIO instance behind MLflow can host the cache.
+    An entry only counts as a hit once its manifest has been written.
+    """
+
+    def __init__(self, uri: str, step: str):
+        self.step = step
+        if uri.startswith("s3://"):
+            import boto3
+            bucket, _, prefix = uri[len("s3://"):].partition("/")
+            self.bucket = bucket
+            self.prefix = "/".join(part for part in (prefix.strip("/"), step) if part)
+            self.s3 = boto3.client("s3", endpoint_url=os.environ.get("MLFLOW_S3_ENDPOINT_URL"))
+            self.root = None
+        else:
+            self.root = Path(uri) / step
+            self.s3 = None
+
+    def fetch(self, key: str, outputs: dict) -> bool:
+        """Copies the cached files to the given {name: path} outputs; returns False on a miss."""
+        manifest = self._read(key, "manifest.json")
+        if manifest is None or set(json.loads(manifest)["outputs"]) != set(outputs):
+            return False
+        for name, path in outputs.items():
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            Path(path).write_bytes(self._read(key, name))
+        print(f"Step cache hit for {self.step} ({key[:12]}); reusing {len(outputs)} cached output(s)")
+        return True
+
+    def store(self, key: str, outputs: dict):
+        """Uploads the {name: path} output files, then the manifest that marks the entry complete."""
+        for name, path in outputs.items():
+            self._write(key, name, Path(path).read_bytes())
+        self._write(key, "manifest.json", json.dumps({"outputs": sorted(outputs)}).encode())
+        print(f"Stored {len(outputs)} output(s) of {self.step} in the step cache ({key[:12]})")
+
+    def _read(self, key: str, name: str):
+        if self.s3 is not None:
+            try:
+                return self.s3.get_object(Bucket=self.bucket, Key=f"{self.prefix}/{key}/{name}")["Body"].read()
+            except self.s3.exceptions.NoSuchKey:
+                return None
+        path = self.root / key / name
+        return path.read_bytes() if path.exists() else None
+
+    def _write(self, key: str, name: str, data: bytes):
+        if self.s3 is not None:
+            self.s3.put_object(Bucket=self.bucket, Key=f"{self.prefix}/{key}/{name}", Body=data)
+            return
+        entry = self.root / key
+        entry.mkdir(parents=True, exist_ok=True)
+        # Write under a temporary name and rename, so concurrent readers never see partial files
+        tmp_path = entry / f".{name}.tmp"
+        tmp_path.write_bytes(data)
+        tmp_path.replace(entry / name)
+
+def open_step_cache(uri: str, step: str):
+    """Returns a StepCache for the step, or None when caching is disabled (empty uri)."""
+    return StepCache(uri, step) if uri else None
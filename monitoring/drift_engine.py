@@ -0,0 +1,294 @@
+import hashlib
+import json
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.spatial import distance
+
+# Evidently's default per-column tests. References of at most 1000 rows: K-S on numeric
+# columns with more than 5 values, chi-square on other columns with more than 2 values,
+# and a two-proportion Z-test on binary ones (p-value < 0.05 means drift). Larger
+# references: normed Wasserstein distance on numeric columns with more than 5 values and
+# Jensen-Shannon distance otherwise (>= 0.1 means drift). The dataset drifts once half of
+# the columns have. Production data is only ever seen as counts on the reference bins:
+# small references bin on every distinct value, so K-S is exact barring ties with the
+# reference values, while Wasserstein on the 20 quantile bins of a large reference puts
+# each bin's mass at the reference mean of that bin. Numeric value counts are taken from
+# the reference.
+SMALL_REFERENCE_ROWS = 1000
+MAX_CATEGORICAL_VALUES = 5
+P_VALUE_THRESHOLD = 0.05
+DISTANCE_THRESHOLD = 0.1
+DATASET_DRIFT_SHARE = 0.5
+NUMERIC_BINS = 20
+MISSING = "__missing__"
+# Bumped when the profile layout changes, so cached profiles are rebuilt
+PROFILE_FORMAT = 2
+
+def file_fingerprint(path: str) -> str:
+    stat = os.stat(path)
+    return hashlib.sha256(f"{Path(path).resolve()}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+
+def _data_files(path: str) -> list:
+    """A single data file, or every Parquet part under a directory (e.g. the service's inference log)."""
+    if Path(path).is_dir():
+        return sorted(Path(path).rglob("*.parquet"))
+    return [Path(path)]
+
+def read_columns(path: str) -> list:
+    first = _data_files(path)[0]
+    if first.suffix.lower() == ".parquet":
+        import pyarrow.parquet as pq
+        return pq.read_schema(first).names
+    return pd.read_csv(first, nrows=0).columns.tolist()
+
+def iter_chunks(path: str, columns: list, chunk_size: int):
+    """Yields the given columns of a CSV/Parquet file or a Parquet directory in bounded chunks."""
+    for data_file in _data_files(path):
+        if data_file.suffix.lower() == ".parquet":
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(data_file).iter_batches(batch_size=chunk_size, columns=columns):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(data_file, usecols=columns, chunksize=chunk_size, low_memory=False)
+
+def read_sample(path: str, columns: list, rows: int) -> pd.DataFrame:
+    """The first rows of a CSV/Parquet file or a Parquet directory."""
+    chunks, total = [], 0
+    for chunk in iter_chunks(path, columns, chunk_size=rows):
+        chunks.append(chunk.iloc[:rows - total])
+        total += len(chunks[-1])
+        if total >= rows:
+            break
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+
+def build_reference_profile(reference_path: str, columns: list) -> dict:
+    """Per-column bin edges (numeric) or category counts (categorical) of the reference data."""
+    if Path(reference_path).suffix.lower() == ".parquet":
+        reference_df = pd.read_parquet(reference_path, columns=columns)
+    else:
+        reference_df = pd.read_csv(reference_path, usecols=columns, low_memory=False)
+
+    profile = {"rows": len(reference_df), "format": PROFILE_FORMAT, "columns": {}}
+    for col in columns:
+        values = reference_df[col]
+        if pd.api.types.is_numeric_dtype(values):
+            finite = values.dropna().to_numpy(dtype=float)
+            if not len(finite):
+                edges = np.array([0.0])
+            elif len(reference_df) <= SMALL_REFERENCE_ROWS:
+                edges = np.unique(finite)
+            else:
+                edges = np.unique(np.quantile(finite, np.linspace(0, 1, NUMERIC_BINS + 1)))
+            counts = _numeric_counts(values, edges)
+            profile["columns"][col] = {
+                "kind": "numeric", "edges": edges.tolist(), "counts": counts.tolist(),
+                "points": _bin_points(finite, edges).tolist(),
+                "unique": int(len(np.unique(finite))), "std": float(np.std(finite)) if len(finite) else 0.0,
+            }
+        else:
+            counts = values.fillna(MISSING).astype(str).value_counts()
+            profile["columns"][col] = {"kind": "categorical", "counts": counts.to_dict()}
+    return profile
+
+def load_reference_profile(reference_path: str, columns: list, cache_dir: str, model_version: str) -> dict:
+    """Returns the cached reference profile for this model version, building it only when stale."""
+    cache_path = Path(cache_dir) / f"reference_profile_{model_version}.json"
+    fingerprint = file_fingerprint(reference_path)
+    if cache_path.exists():
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if (cached.get("format") == PROFILE_FORMAT and cached["fingerprint"] == fingerprint
+                and set(columns) <= set(cached["columns"])):
+            print(f"Using cached reference profile {cache_path}")
+            return cached
+
+    print(f"Building reference profile for model version '{model_version}'...")
+    profile = build_reference_profile(reference_path, columns)
+    profile["fingerprint"] = fingerprint
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(cache_path, "w") as f:
+        json.dump(profile, f)
+    return profile
+
+def _bin_points(finite: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """One value per numeric bin: the mean of the reference values in it, else its nearest edge."""
+    bins = np.searchsorted(edges, finite, side="right")
+    counts = np.bincount(bins, minlength=len(edges) + 1)
+    sums = np.bincount(bins, weights=finite, minlength=len(edges) + 1)
+    nearest_edge = edges[np.clip(np.arange(len(edges) + 1) - 1, 0, len(edges) - 1)]
+    return np.where(counts > 0, sums / np.maximum(counts, 1), nearest_edge)
+
+def _numeric_counts(values: pd.Series, edges: np.ndarray) -> np.ndarray:
+    """Counts per reference bin, with open-ended outer bins plus a trailing missing-value bin."""
+    numeric = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    missing = np.isnan(numeric)
+    bins = np.searchsorted(edges, numeric[~missing], side="right")
+    counts = np.bincount(bins, minlength=len(edges) + 1)
+    return np.append(counts, missing.sum())
+
+def _sample_chunk(chunk: pd.DataFrame, fraction: float, stratify_by: str, seed: int) -> pd.DataFrame:
+    if fraction >= 1.0:
+        return chunk
+    if stratify_by and stratify_by in chunk.columns:
+        return chunk.groupby(chunk[stratify_by].fillna(MISSING)).sample(frac=fraction, random_state=seed)
+    return chunk.sample(frac=fraction, random_state=seed)
+
+def _empty_counts(profile: dict, columns: list) -> dict:
+    totals = {}
+    for col in columns:
+        spec = profile["columns"][col]
+        totals[col] = np.zeros(len(spec["edges"]) + 2, dtype=np.int64) if spec["kind"] == "numeric" else Counter()
+    return totals
+
+def _count_chunks(chunks, profile: dict, columns: list, sample_fraction: float, stratify_by: str, seed: int) -> tuple:
+    """(rows, per-column counts) of the given chunks, binned against the reference profile."""
+    totals = _empty_counts(profile, columns)
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        chunk = _sample_chunk(chunk, sample_fraction, stratify_by, seed=seed + i)
+        rows += len(chunk)
+        for col in columns:
+            spec = profile["columns"][col]
+            if spec["kind"] == "numeric":
+                totals[col] += _numeric_counts(chunk[col], np.asarray(spec["edges"]))
+            else:
+                totals[col].update(chunk[col].fillna(MISSING).astype(str).value_counts().to_dict())
+    return rows, totals
+
+def _count_row_group(args) -> tuple:
+    """Worker task: reads one Parquet row group itself, so no data crosses the process boundary."""
+    data_file, row_group, profile, columns, chunk_size, sample_fraction, stratify_by, seed = args
+    import pyarrow.parquet as pq
+    batches = pq.ParquetFile(data_file).iter_batches(batch_size=chunk_size, row_groups=[row_group], columns=columns)
+    return _count_chunks((batch.to_pandas() for batch in batches), profile, columns, sample_fraction, stratify_by, seed)
+
+def _count_chunk(args) -> tuple:
+    chunk, profile, columns, sample_fraction, stratify_by, seed = args
+    return _count_chunks([chunk], profile, columns, sample_fraction, stratify_by, seed)
+
+def _iter_tasks(path: str, profile: dict, columns: list, chunk_size: int, sample_fraction: float, stratify_by: str):
+    """(worker function, args) per unit of work: a Parquet row group, or a CSV chunk read here."""
+    for file_index, data_file in enumerate(_data_files(path)):
+        seed = file_index << 20
+        if data_file.suffix.lower() == ".parquet":
+            import pyarrow.parquet as pq
+            for row_group in range(pq.ParquetFile(data_file).num_row_groups):
+                yield _count_row_group, (str(data_file), row_group, profile, columns, chunk_size, sample_fraction, stratify_by, seed + (row_group << 10))
+        else:
+            for i, chunk in enumerate(pd.read_csv(data_file, usecols=columns, chunksize=chunk_size, low_memory=False)):
+                yield _count_chunk, (chunk, profile, columns, sample_fraction, stratify_by, seed + i)
+
+def accumulate_current_counts(path: str, profile: dict, columns: list, chunk_size: int,
+                              sample_fraction: float = 1.0, stratify_by: str = None, workers: int = 1) -> dict:
+    """
+    Streams production data once, binning it against the reference profile in a
+    process pool and merging the per-task counts. Parquet row groups are read by the
+    workers; CSV chunks are read here and handed over, with at most two tasks per
+    worker in flight so memory stays bounded.
+    """
+    totals = _empty_counts(profile, columns)
+    rows = 0
+
+    def merge(result):
+        nonlocal rows
+        task_rows, task_totals = result
+        rows += task_rows
+        for col, counts in task_totals.items():
+            if isinstance(counts, Counter):
+                totals[col].update(counts)
+            else:
+                totals[col] += counts
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for func, args in _iter_tasks(path, profile, columns, chunk_size, sample_fraction, stratify_by):
+            pending.append(executor.submit(func, args))
+            if len(pending) >= 2 * workers:
+                merge(pending.popleft().result())
+        while pending:
+            merge(pending.popleft().result())
+    return {"rows": rows, "columns": totals}
+
+def column_drift(args) -> dict:
+    """Drift test for one column from reference and current bin counts, chosen as Evidently does."""
+    col, spec, current_counts, reference_rows = args
+    # Missing values are left out of every test, as Evidently drops them
+    if spec["kind"] == "numeric":
+        reference = np.asarray(spec["counts"][:-1], dtype=float)
+        current = np.asarray(current_counts[:-1], dtype=float)
+        num_values = spec["unique"]
+    else:
+        categories = sorted((set(spec["counts"]) | set(current_counts)) - {MISSING})
+        reference = np.array([spec["counts"].get(c, 0) for c in categories], dtype=float)
+        current = np.array([current_counts.get(c, 0) for c in categories], dtype=float)
+        num_values = int(np.count_nonzero(reference + current))
+
+    if current.sum() == 0 or reference.sum() == 0:
+        return {"column": col, "stattest": "none", "score": None, "drift_detected": False}
+
+    numeric = spec["kind"] == "numeric" and num_values > MAX_CATEGORICAL_VALUES
+    if reference_rows <= SMALL_REFERENCE_ROWS:
+        if numeric:
+            stattest, p_value = "K-S p_value", _ks_p_value(reference, current)
+        elif num_values > 2:
+            stattest, p_value = "chi-square p_value", _chi_square_p_value(reference, current)
+        else:
+            stattest, p_value = "Z-test p_value", _z_test_p_value(reference, current)
+        return {"column": col, "stattest": stattest, "score": p_value, "drift_detected": bool(p_value < P_VALUE_THRESHOLD)}
+
+    if numeric:
+        points = np.asarray(spec["points"])
+        score = stats.wasserstein_distance(points, points, reference, current) / max(spec["std"], 0.001)
+        stattest = "Wasserstein distance (normed)"
+    else:
+        score = distance.jensenshannon(reference / reference.sum(), current / current.sum())
+        stattest = "Jensen-Shannon distance"
+    return {"column": col, "stattest": stattest, "score": float(score), "drift_detected": bool(score >= DISTANCE_THRESHOLD)}
+
+def _ks_p_value(reference: np.ndarray, current: np.ndarray) -> float:
+    """Two-sample K-S from counts on bins split at every reference value (scipy's asymptotic p-value)."""
+    n, m = reference.sum(), current.sum()
+    statistic = np.max(np.abs(np.cumsum(reference) / n - np.cumsum(current) / m))
+    return float(stats.kstwo.sf(statistic, max(int(round(n * m / (n + m))), 1)))
+
+def _chi_square_p_value(reference: np.ndarray, current: np.ndarray) -> float:
+    """Goodness of fit of the current counts to the reference proportions."""
+    expected = reference * current.sum() / reference.sum()
+    if np.any(current[expected == 0] > 0):
+        return 0.0  # Values never seen in the reference
+    observed = expected > 0
+    return float(stats.chisquare(current[observed], expected[observed]).pvalue)
+
+def _z_test_p_value(reference: np.ndarray, current: np.ndarray) -> float:
+    """Two-sided two-proportion Z-test on the share of the first value."""
+    values = np.flatnonzero(reference + current)
+    n1, n2 = reference.sum(), current.sum()
+    p1, p2 = reference[values[0]] / n1, current[values[0]] / n2
+    pooled = (p1 * n1 + p2 * n2) / (n1 + n2)
+    if pooled in (0.0, 1.0):
+        return 1.0
+    z = (p1 - p2) / np.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+    return float(2 * stats.norm.sf(abs(z)))
+
+def compute_drift(profile: dict, current: dict, columns: list, workers: int) -> dict:
+    """Runs the per-column tests in a process pool and summarises them like Evidently's DatasetDriftMetric."""
+    tasks = [(col, profile["columns"][col], current["columns"][col], profile["rows"]) for col in columns]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        column_results = list(executor.map(column_drift, tasks))
+
+    num_drifted = sum(result["drift_detected"] for result in column_results)
+    share = num_drifted / len(columns) if columns else 0.0
+    return {
+        "dataset_drift": share >= DATASET_DRIFT_SHARE,
+        "share_of_drifted_columns": share,
+        "number_of_drifted_columns": num_drifted,
+        "number_of_columns": len(columns),
+        "reference_rows": profile["rows"],
+        "current_rows": current["rows"],
+        "drift_by_columns": {result["column"]: result for result in column_results},
+    }
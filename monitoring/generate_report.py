@@ -1,18 +1,24 @@
+import argparse
 import os
-import pandas as pd
 import requests
 import json
-from evidently.report import Report
-from evidently.metric_preset import DataDriftPreset, TargetDriftPreset
 from datetime import datetime
+from common.instrumentation import Instrumentation
+from drift_engine import read_columns, read_sample, load_reference_profile, accumulate_current_counts, compute_drift
 
 # --- Configuration ---
 # In a real system, these would be fetched from a database or log store.
 # For this example, we'll use local CSV files.
 # The CronJob's volume mounts will provide these files to the container.
+# Production data may also be the Bento service's inference log directory (Parquet parts).
 REFERENCE_DATA_PATH = "/data/reference_data.csv"
 PRODUCTION_DATA_PATH = "/data/production_traffic.csv"
+# Reference statistics are computed once per model version and reused every night
+REFERENCE_PROFILE_DIR = "/data/reference_profiles"
 REPORT_OUTPUT_PATH = f"/reports/drift_report_{datetime.now().strftime('%Y-%m-%d')}.html"
+SUMMARY_OUTPUT_PATH = f"/reports/drift_summary_{datetime.now().strftime('%Y-%m-%d')}.json"
+
+instrumentation = Instrumentation("drift_report")
 
 def send_slack_alert(message: str):
     """Sends a formatted message to a Slack channel via a webhook."""
@@ -31,41 +37,68 @@ def send_slack_alert(message: str):
     except requests.exceptions.RequestException as e:
         print(f"ERROR: Failed to send Slack alert: {e}")
 
-def generate_and_alert_on_drift():
-    """
-    Generates a data drift report using Evidently AI and sends a Slack
-    alert if significant drift is detected.
-    """
-    print(f"Loading reference data from: {REFERENCE_DATA_PATH}")
-    reference_df = pd.read_csv(REFERENCE_DATA_PATH)
+def save_evidently_report(reference_path: str, production_path: str, columns: list, sample_rows: int):
+    """Renders the visual Evidently report on a bounded sample of both datasets."""
+    from evidently.report import Report
+    from evidently.metric_preset import DataDriftPreset
 
-    print(f"Loading production data from: {PRODUCTION_DATA_PATH}")
-    production_df = pd.read_csv(PRODUCTION_DATA_PATH)
+    reference_df = read_sample(reference_path, columns, sample_rows)
+    production_df = read_sample(production_path, columns, sample_rows)
+    drift_report = Report(metrics=[DataDriftPreset()])
+    drift_report.run(reference_data=reference_df, current_data=production_df)
 
-    # For TargetDriftPreset, we need a 'prediction' and 'target' column.
-    # We will simulate this for the example.
-    # In reality, you'd join your inference logs with ground truth labels.
-    
-    print("Generating drift report...")
-    drift_report = Report(metrics=[
-        DataDriftPreset(),
-        # TargetDriftPreset(), # Enable this when you have ground truth labels
-    ])
-    
-    # We need to ensure columns match for comparison
-    common_columns = list(set(reference_df.columns) & set(production_df.columns))
-    drift_report.run(reference_data=reference_df[common_columns], current_data=production_df[common_columns])
-    
-    # Save the visual HTML report to a persistent volume for inspection
-    report_dir = os.path.dirname(REPORT_OUTPUT_PATH)
-    os.makedirs(report_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(REPORT_OUTPUT_PATH), exist_ok=True)
     drift_report.save_html(REPORT_OUTPUT_PATH)
     print(f"Drift report saved to {REPORT_OUTPUT_PATH}")
 
+def generate_and_alert_on_drift(
+    reference_path: str = REFERENCE_DATA_PATH,
+    production_path: str = PRODUCTION_DATA_PATH,
+    model_version: str = "latest",
+    chunk_size: int = 100_000,
+    workers: int = None,
+    sample_fraction: float = 1.0,
+    stratify_by: str = None,
+    html_sample_rows: int = 0
+):
+    """
+    Computes per-column data drift between the reference data and production
+    traffic and sends a Slack alert if significant drift is detected.
+    Production traffic is binned in a process pool against a cached reference
+    profile, and the per-column tests run in the same number of processes.
+    """
+    workers = workers or os.cpu_count()
+    # We need to ensure columns match for comparison
+    common_columns = sorted(set(read_columns(reference_path)) & set(read_columns(production_path)))
+
+    print(f"Loading reference profile for: {reference_path}")
+    with instrumentation.stage("load") as stage:
+        profile = load_reference_profile(reference_path, common_columns, REFERENCE_PROFILE_DIR, model_version)
+        stage.rows = profile["rows"]
+
+    print(f"Streaming production data from: {production_path}")
+    with instrumentation.stage("transform") as stage:
+        current = accumulate_current_counts(
+            production_path, profile, common_columns, chunk_size,
+            sample_fraction=sample_fraction, stratify_by=stratify_by, workers=workers
+        )
+        stage.rows = current["rows"]
+
+    print("Computing drift...")
+    with instrumentation.stage("drift", rows=len(common_columns)):
+        drift_details = compute_drift(profile, current, common_columns, workers=workers)
+
+    with instrumentation.stage("report"):
+        if html_sample_rows:
+            save_evidently_report(reference_path, production_path, common_columns, html_sample_rows)
+
+    os.makedirs(os.path.dirname(SUMMARY_OUTPUT_PATH), exist_ok=True)
+    with open(SUMMARY_OUTPUT_PATH, "w") as f:
+        json.dump({**drift_details, "timings": instrumentation.metrics()}, f)
+    print(f"Drift summary saved to {SUMMARY_OUTPUT_PATH}")
+    instrumentation.report()
+
     # --- Alerting Logic ---
-    report_dict = drift_report.as_dict()
-    drift_details = report_dict['metrics'][0]['result']
-    
     drift_detected = drift_details['dataset_drift']
     drift_score = drift_details['share_of_drifted_columns']
     num_drifted_columns = drift_details['number_of_drifted_columns']
@@ -77,8 +110,11 @@ def generate_and_alert_on_drift():
             f"> *Drift Detected:* `{drift_detected}`\n"
             f"> *Drift Score (Share of Drifted Columns):* `{drift_score:.2%}`\n"
             f"> *Number of Drifted Columns:* `{num_drifted_columns}`\n\n"
-            f"A full report has been generated and is available for review in the MLOps dashboard."
         )
+        if html_sample_rows:
+            message += f"A report on a {html_sample_rows:,}-row sample has been generated and is available for review in the MLOps dashboard."
+        else:
+            message += f"See the drift summary at `{SUMMARY_OUTPUT_PATH}`."
         send_slack_alert(message)
     else:
         print("No significant data drift detected.")
@@ -86,4 +122,25 @@ def generate_and_alert_on_drift():
         # send_slack_alert(":white_check_mark: Daily model monitoring check passed for `license-classification`. No data drift detected.")
 
 if __name__ == "__main__":
-    generate_and_alert_on_drift()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reference_data", default=REFERENCE_DATA_PATH)
+    parser.add_argument("--production_data", default=os.getenv("PRODUCTION_DATA_PATH", PRODUCTION_DATA_PATH),
+                        help="CSV/Parquet file, or a Parquet directory such as the service's inference log.")
+    parser.add_argument("--model_version", default=os.getenv("MODEL_VERSION", "latest"))
+    parser.add_argument("--chunk_size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sample_fraction", type=float, default=1.0, help="Fraction of production rows to keep per chunk.")
+    parser.add_argument("--stratify_by", default=None, help="Column to stratify sampling on, e.g. APPLICATION_TYPE.")
+    parser.add_argument("--html_sample_rows", type=int, default=0, help="Also render the Evidently HTML report on this many rows.")
+    args = parser.parse_args()
+    with instrumentation.profiled():
+        generate_and_alert_on_drift(
+            reference_path=args.reference_data,
+            production_path=args.production_data,
+            model_version=args.model_version,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            sample_fraction=args.sample_fraction,
+            stratify_by=args.stratify_by,
+            html_sample_rows=args.html_sample_rows
+        )
\ No newline at end of file
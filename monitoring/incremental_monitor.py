@@ -0,0 +1,306 @@
+import argparse
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import pandas as pd
+from drift_engine import file_fingerprint
+from sketches import QuantileSketch, CategorySketch, jensen_shannon_distance
+
+# --- Configuration ---
+REFERENCE_DATA_PATH = "/data/reference_data.csv"
+INFERENCE_LOG_PATH = "/data/inference_logs"
+STATE_DIR = "/data/monitoring_state"
+
+NUMERIC_FEATURES = ["SSA"]
+CATEGORICAL_FEATURES = ["APPLICATION_TYPE", "BUSINESS_TYPE"]
+TIMESTAMP_COLUMN = "timestamp"
+WINDOWS = {"hourly": timedelta(hours=1), "daily": timedelta(days=1), "weekly": timedelta(weeks=1)}
+DRIFT_THRESHOLD = 0.1  # Jensen-Shannon distance, the nightly report's threshold for large references
+NUMERIC_BINS = 20  # Reference-quantile bins for numeric features, as in drift_engine
+MIN_WINDOW_ROWS = 1000  # Smaller windows are reported but not scored
+BUCKET_FORMAT = "%Y-%m-%dT%H"
+PENDING_SUFFIX = ".pending"
+
+def new_sketches() -> dict:
+    sketches = {col: QuantileSketch() for col in NUMERIC_FEATURES}
+    sketches.update({col: CategorySketch() for col in CATEGORICAL_FEATURES})
+    return sketches
+
+def update_sketches(sketches: dict, df: pd.DataFrame):
+    for col, sketch in sketches.items():
+        if col in df.columns:
+            sketch.update(df[col])
+
+def save_sketches(sketches: dict, path: Path):
+    _write_json({col: sketch.to_dict() for col, sketch in sketches.items()}, path)
+
+def load_sketches(path: Path) -> dict:
+    with open(path) as f:
+        return sketches_from_dict(json.load(f))
+
+def sketches_from_dict(data: dict) -> dict:
+    return {
+        col: (QuantileSketch if col in NUMERIC_FEATURES else CategorySketch).from_dict(sketch)
+        for col, sketch in data.items()
+    }
+
+def _write_json(data: dict, path: Path):
+    """Writes through a temporary file, so readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+class SketchStore:
+    """
+    Hourly sketch buckets, reference sketches and a log checkpoint, all kept as local
+    files. Updated buckets are first written next to the live ones, and only become
+    part of the state once the checkpoint naming them is saved, so a crash between
+    files never counts a batch twice.
+    """
+
+    def __init__(self, state_dir: str):
+        self.state_dir = Path(state_dir)
+        self.bucket_dir = self.state_dir / "hourly"
+        self.checkpoint_path = self.state_dir / "checkpoint.json"
+
+    def load_checkpoint(self) -> dict:
+        """
+        {"files": rows read per log file, "done": fully read Parquet parts (immutable,
+        never reopened), "pruned_before": hour before which log partitions are ignored,
+        "batch": number of the last committed batch, "pending": its staged bucket files}.
+        Pending buckets left behind by a crash are moved into place first.
+        """
+        checkpoint = {"files": {}, "done": [], "pruned_before": None, "batch": 0, "pending": {}}
+        if self.checkpoint_path.exists():
+            with open(self.checkpoint_path) as f:
+                checkpoint.update(json.load(f))
+        self.apply_pending(checkpoint)
+        return checkpoint
+
+    def save_checkpoint(self, checkpoint: dict):
+        _write_json(checkpoint, self.checkpoint_path)
+
+    def reference(self, reference_path: str, model_version: str) -> dict:
+        """Sketches of the reference data for this model version, rebuilt only when the data changes."""
+        cache_path = self.state_dir / f"reference_sketches_{model_version}.json"
+        fingerprint = file_fingerprint(reference_path)
+        if cache_path.exists():
+            with open(cache_path) as f:
+                cached = json.load(f)
+            if cached["fingerprint"] == fingerprint:
+                return sketches_from_dict(cached["sketches"])
+        print(f"Building reference sketches for model version '{model_version}' from {reference_path}...")
+        sketches = new_sketches()
+        columns = NUMERIC_FEATURES + CATEGORICAL_FEATURES
+        for chunk in pd.read_csv(reference_path, usecols=lambda c: c in columns, chunksize=100_000):
+            update_sketches(sketches, chunk)
+        _write_json({"fingerprint": fingerprint, "sketches": {col: sketch.to_dict() for col, sketch in sketches.items()}}, cache_path)
+        return sketches
+
+    def stage_buckets(self, df: pd.DataFrame, batch: int) -> dict:
+        """
+        Merges a batch of logged rows into the hourly bucket sketches they belong to,
+        writing each result as a pending file named after the batch. Returns
+        {pending file: bucket file} to commit.
+        """
+        hours = pd.to_datetime(df[TIMESTAMP_COLUMN], utc=True).dt.strftime(BUCKET_FORMAT)
+        staged = {}
+        for hour, rows in df.groupby(hours):
+            path = self.bucket_dir / f"{hour}.json"
+            sketches = load_sketches(path) if path.exists() else new_sketches()
+            update_sketches(sketches, rows)
+            pending_path = path.with_name(f"{path.name}.{batch}{PENDING_SUFFIX}")
+            save_sketches(sketches, pending_path)
+            staged[str(pending_path)] = str(path)
+        return staged
+
+    def apply_pending(self, checkpoint: dict):
+        """Moves the committed pending buckets into place; those already moved are skipped."""
+        for pending_path, path in checkpoint["pending"].items():
+            if os.path.exists(pending_path):
+                os.replace(pending_path, path)
+
+    def window(self, end: datetime, length: timedelta) -> dict:
+        """Merged sketches of every hourly bucket starting in [end - length, end)."""
+        merged = new_sketches()
+        for path in self.bucket_dir.glob("*.json"):
+            hour = datetime.strptime(path.stem, BUCKET_FORMAT).replace(tzinfo=timezone.utc)
+            if end - length <= hour < end:
+                for col, sketch in load_sketches(path).items():
+                    merged[col].merge(sketch)
+        return merged
+
+    def prune(self, before: datetime):
+        """Drops hourly buckets before the given hour, and the checkpoint entries of their log partitions."""
+        # Also drops pending buckets of batches that were never committed
+        for path in [*self.bucket_dir.glob("*.json"), *self.bucket_dir.glob("*" + PENDING_SUFFIX)]:
+            if datetime.strptime(path.name.split(".")[0], BUCKET_FORMAT).replace(tzinfo=timezone.utc) < before:
+                path.unlink()
+
+        checkpoint = self.load_checkpoint()
+        checkpoint["files"] = {file: rows for file, rows in checkpoint["files"].items() if not _partition_before(file, before)}
+        checkpoint["done"] = [file for file in checkpoint["done"] if not _partition_before(file, before)]
+        checkpoint["pruned_before"] = before.strftime(BUCKET_FORMAT)
+        self.save_checkpoint(checkpoint)
+
+def _partition_before(file: str, before: datetime) -> bool:
+    """Whether a log file sits in an hour=YYYY-MM-DDTHH partition older than the given hour."""
+    partition = Path(file).parent.name
+    if not partition.startswith("hour="):
+        return False
+    return datetime.strptime(partition[len("hour="):], BUCKET_FORMAT).replace(tzinfo=timezone.utc) < before
+
+def iter_new_rows(log_path: str, checkpoint: dict, batch_size: int):
+    """
+    Yields (file, rows consumed so far, file fully read, batch) for log rows not yet
+    seen. Accepts a single CSV/Parquet file or a directory of them. Parquet parts are
+    immutable, so parts marked done in the checkpoint are skipped without opening them.
+    """
+    path = Path(log_path)
+    files = sorted(p for p in path.rglob("*") if p.suffix in (".parquet", ".csv")) if path.is_dir() else [path]
+    done = set(checkpoint["done"])
+    pruned_before = checkpoint["pruned_before"]
+    if pruned_before:
+        pruned_before = datetime.strptime(pruned_before, BUCKET_FORMAT).replace(tzinfo=timezone.utc)
+    for file in files:
+        if str(file) in done or (pruned_before and _partition_before(str(file), pruned_before)):
+            continue
+        consumed = checkpoint["files"].get(str(file), 0)
+        if file.suffix == ".parquet":
+            import pyarrow.parquet as pq
+            parquet_file = pq.ParquetFile(file)
+            total = parquet_file.metadata.num_rows
+            if total <= consumed:
+                yield str(file), consumed, True, pd.DataFrame()
+                continue
+            seen = 0
+            for batch in parquet_file.iter_batches(batch_size=batch_size):
+                if seen + batch.num_rows <= consumed:
+                    seen += batch.num_rows
+                    continue
+                df = batch.to_pandas().iloc[max(consumed - seen, 0):]
+                seen += batch.num_rows
+                consumed += len(df)
+                yield str(file), consumed, consumed >= total, df
+        else:
+            reader = pd.read_csv(file, skiprows=range(1, consumed + 1), chunksize=batch_size)
+            for df in reader:
+                consumed += len(df)
+                yield str(file), consumed, False, df
+
+def ingest(store: SketchStore, log_path: str, batch_size: int) -> int:
+    """
+    Folds new inference log rows into the hourly sketches. Each batch is committed by
+    a single checkpoint write that records both the new log offsets and the staged
+    buckets, which are moved into place only afterwards.
+    """
+    checkpoint = store.load_checkpoint()
+    rows = 0
+    for file, consumed, complete, df in iter_new_rows(log_path, checkpoint, batch_size):
+        batch = checkpoint["batch"] + 1
+        staged = {}
+        if len(df):
+            if TIMESTAMP_COLUMN not in df.columns:
+                df = df.assign(**{TIMESTAMP_COLUMN: datetime.now(timezone.utc)})
+            staged = store.stage_buckets(df, batch)
+        if complete:
+            checkpoint["files"].pop(file, None)
+            checkpoint["done"].append(file)
+        else:
+            checkpoint["files"][file] = consumed
+        checkpoint["batch"] = batch
+        checkpoint["pending"] = staged
+        store.save_checkpoint(checkpoint)
+        store.apply_pending(checkpoint)
+        rows += len(df)
+    return rows
+
+def feature_distributions(reference: dict, current: dict) -> dict:
+    """(reference, current) counts per feature; numeric features on the reference's quantile bins."""
+    distributions = {}
+    for col in reference:
+        if col in NUMERIC_FEATURES:
+            edges = reference[col].quantile_edges(NUMERIC_BINS)
+            distributions[col] = (reference[col].binned_distribution(edges), current[col].binned_distribution(edges))
+        else:
+            distributions[col] = (reference[col].distribution(), current[col].distribution())
+    return distributions
+
+def window_drift_scores(store: SketchStore, reference: dict, end: datetime) -> dict:
+    """Scores each window of completed hours ending at `end`; windows under MIN_WINDOW_ROWS are not scored."""
+    scores = {}
+    for name, length in WINDOWS.items():
+        current = store.window(end, length)
+        rows = current[CATEGORICAL_FEATURES[0]].count
+        if rows < MIN_WINDOW_ROWS:
+            per_feature = {col: float("nan") for col in reference}
+        else:
+            per_feature = {
+                col: jensen_shannon_distance(ref_counts, cur_counts)
+                for col, (ref_counts, cur_counts) in feature_distributions(reference, current).items()
+            }
+        drifted = [col for col, score in per_feature.items() if score == score and score >= DRIFT_THRESHOLD]
+        scores[name] = {
+            "rows": rows,
+            "scored": rows >= MIN_WINDOW_ROWS,
+            "scores": per_feature,
+            "drifted_columns": drifted,
+            "quantiles": {col: {"p50": current[col].quantile(0.5), "p95": current[col].quantile(0.95)} for col in NUMERIC_FEATURES},
+        }
+    return scores
+
+def run_incremental_monitoring(log_path: str, reference_path: str, state_dir: str, batch_size: int, alert: bool,
+                               model_version: str = "latest"):
+    store = SketchStore(state_dir)
+    reference = store.reference(reference_path, model_version)
+
+    new_rows = ingest(store, log_path, batch_size)
+    print(f"Ingested {new_rows} new inference log rows")
+
+    # Windows end at the start of the current hour, so the hourly window is the last completed hour
+    window_end = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    scores = window_drift_scores(store, reference, window_end)
+    store.prune(window_end - max(WINDOWS.values()))
+
+    with open(store.state_dir / "window_scores.json", "w") as f:
+        json.dump({"computed_at": datetime.now(timezone.utc).isoformat(), "window_end": window_end.isoformat(), "windows": scores}, f, indent=2)
+    for name, result in scores.items():
+        if not result["scored"]:
+            print(f"{name}: {result['rows']} rows, below {MIN_WINDOW_ROWS}; not scored")
+            continue
+        print(f"{name}: {result['rows']} rows, drifted columns: {result['drifted_columns'] or 'none'}")
+
+    drifted_windows = {name: result for name, result in scores.items() if result["drifted_columns"]}
+    if alert and drifted_windows:
+        from generate_report import send_slack_alert
+        lines = "\n".join(
+            f"> *{name.capitalize()} window:* `{', '.join(result['drifted_columns'])}`"
+            for name, result in drifted_windows.items()
+        )
+        send_slack_alert(
+            f":warning: *Production Model Drift Alert!* \n\n"
+            f"> *Project:* `license-classification`\n"
+            f"{lines}\n\n"
+            f"Window scores are available in `{store.state_dir / 'window_scores.json'}`."
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logs", default=INFERENCE_LOG_PATH)
+    parser.add_argument("--reference", default=REFERENCE_DATA_PATH)
+    parser.add_argument("--model_version", default=os.getenv("MODEL_VERSION", "latest"))
+    parser.add_argument("--state_dir", default=STATE_DIR)
+    parser.add_argument("--batch_size", type=int, default=10_000)
+    parser.add_argument("--no_alert", action="store_true")
+    args = parser.parse_args()
+    run_incremental_monitoring(
+        log_path=args.logs,
+        reference_path=args.reference,
+        state_dir=args.state_dir,
+        batch_size=args.batch_size,
+        alert=not args.no_alert,
+        model_version=args.model_version
+    )
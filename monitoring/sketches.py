@@ -0,0 +1,157 @@
+import math
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+class QuantileSketch:
+    """
+    Mergeable log-bucketed quantile sketch (DDSketch-style): every value lands in a
+    bucket whose bounds are within relative_accuracy of each other, so two sketches
+    merge by adding bucket counts.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.positive = Counter()
+        self.negative = Counter()
+        self.zero = 0
+        self.missing = 0
+
+    @property
+    def count(self) -> int:
+        return sum(self.positive.values()) + sum(self.negative.values()) + self.zero
+
+    def _value(self, key: int) -> float:
+        return 2 * self._gamma ** key / (1 + self._gamma)
+
+    def update(self, values):
+        values = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float)
+        missing = np.isnan(values)
+        self.missing += int(missing.sum())
+        values = values[~missing]
+        self.zero += int((values == 0).sum())
+        for store, magnitudes in ((self.positive, values[values > 0]), (self.negative, -values[values < 0])):
+            keys, counts = np.unique(np.ceil(np.log(magnitudes) / self._log_gamma).astype(int), return_counts=True)
+            store.update(dict(zip(keys.tolist(), counts.tolist())))
+
+    def merge(self, other: "QuantileSketch"):
+        self.positive.update(other.positive)
+        self.negative.update(other.negative)
+        self.zero += other.zero
+        self.missing += other.missing
+        return self
+
+    def quantile(self, q: float) -> float:
+        total = self.count
+        if total == 0:
+            return float("nan")
+        rank = q * (total - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive)) if self.positive else 0.0
+
+    def quantile_edges(self, bins: int) -> list:
+        """Bin edges at evenly spaced quantiles, e.g. of the reference sketch."""
+        return sorted({self.quantile(q) for q in np.linspace(0, 1, bins + 1)})
+
+    def binned_distribution(self, edges: list) -> dict:
+        """
+        Counts per coarse bin between edges (outer bins open-ended), each bucket placed
+        by its representative value. Raw buckets are ~1% wide, about one per distinct
+        value, which makes distances between samples of the same data look like drift.
+        """
+        edges = np.asarray(edges, dtype=float)
+        counts = Counter()
+        for sign, store in ((-1, self.negative), (1, self.positive)):
+            for key, count in store.items():
+                counts[int(np.searchsorted(edges, sign * self._value(key), side="right"))] += count
+        if self.zero:
+            counts[int(np.searchsorted(edges, 0.0, side="right"))] += self.zero
+        bins = {f"bin{index}": count for index, count in counts.items()}
+        if self.missing:
+            bins["missing"] = self.missing
+        return bins
+
+    def distribution(self) -> dict:
+        """Bucket counts keyed by a stable label, for comparing two sketches."""
+        buckets = {f"-{key}": count for key, count in self.negative.items()}
+        buckets.update({f"+{key}": count for key, count in self.positive.items()})
+        if self.zero:
+            buckets["0"] = self.zero
+        if self.missing:
+            buckets["missing"] = self.missing
+        return buckets
+
+    def to_dict(self) -> dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "positive": {str(k): v for k, v in self.positive.items()},
+            "negative": {str(k): v for k, v in self.negative.items()},
+            "zero": self.zero,
+            "missing": self.missing,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"])
+        sketch.positive = Counter({int(k): v for k, v in data["positive"].items()})
+        sketch.negative = Counter({int(k): v for k, v in data["negative"].items()})
+        sketch.zero = data["zero"]
+        sketch.missing = data["missing"]
+        return sketch
+
+class CategorySketch:
+    """Exact per-category counts; merges by addition."""
+
+    def __init__(self):
+        self.counts = Counter()
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts.values())
+
+    def update(self, values):
+        self.counts.update(pd.Series(values).fillna("missing").astype(str).value_counts().to_dict())
+
+    def merge(self, other: "CategorySketch"):
+        self.counts.update(other.counts)
+        return self
+
+    def distribution(self) -> dict:
+        return dict(self.counts)
+
+    def to_dict(self) -> dict:
+        return {"counts": dict(self.counts)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CategorySketch":
+        sketch = cls()
+        sketch.counts = Counter(data["counts"])
+        return sketch
+
+def jensen_shannon_distance(reference: dict, current: dict) -> float:
+    """Jensen-Shannon distance (base 2) between two bucket-count distributions."""
+    ref_total, cur_total = sum(reference.values()), sum(current.values())
+    if ref_total == 0 or cur_total == 0:
+        return float("nan")
+    divergence = 0.0
+    for key in set(reference) | set(current):
+        p, q = reference.get(key, 0) / ref_total, current.get(key, 0) / cur_total
+        m = (p + q) / 2
+        if p:
+            divergence += p * math.log2(p / m) / 2
+        if q:
+            divergence += q * math.log2(q / m) / 2
+    return math.sqrt(max(divergence, 0.0))
@@ -1,6 +1,32 @@
+import argparse
+import os
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+DATE_COLUMNS = ['DATE_ISSUED', 'LICENSE_STATUS_CHANGE_DATE', 'APPLICATION_REQUIREMENTS_COMPLETE', 'PAYMENT_DATE']
+REQUIRED_COLUMNS = ['event_timestamp', 'created_timestamp', 'LICENSE_ID', 'LICENSE_STATUS']
+# The city export writes every date as e.g. 2004-02-10T00:00:00
+DEFAULT_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+def add_feast_timestamps(df: pd.DataFrame, date_format: str = None) -> pd.DataFrame:
+    """Parses the date columns, derives event/created timestamps and drops unusable rows."""
+    for col in DATE_COLUMNS:
+        df[col] = pd.to_datetime(df[col], format=date_format, errors='coerce')
+
+    df['event_timestamp'] = df['DATE_ISSUED'].fillna(df['LICENSE_STATUS_CHANGE_DATE']).fillna(df['APPLICATION_REQUIREMENTS_COMPLETE']).fillna(df['PAYMENT_DATE'])
+
+    # Element-wise minimum that skips missing values, without a row-wise reduction
+    complete, payment = df['APPLICATION_REQUIREMENTS_COMPLETE'], df['PAYMENT_DATE']
+    earliest = complete.where((complete <= payment) | payment.isna(), payment)
+    df['created_timestamp'] = earliest.fillna(df['event_timestamp'])
+
+    return df.dropna(subset=REQUIRED_COLUMNS).astype({'LICENSE_ID': int})
+
 def prepare_data_for_feast(
     input_csv_path: str,
     output_dir: str,
@@ -8,33 +34,114 @@ def prepare_data_for_feast(
 ):
     print(f"Loading raw data from {input_csv_path}...")
     df = pd.read_csv(input_csv_path, low_memory=False)
-
-    print("Converting date columns to datetime format...")
-    date_columns = ['DATE_ISSUED', 'LICENSE_STATUS_CHANGE_DATE', 'APPLICATION_REQUIREMENTS_COMPLETE', 'PAYMENT_DATE']
-    for col in date_columns:
-        df[col] = pd.to_datetime(df[col], errors='coerce')
-
-    print("Creating the event_timestamp...")
-    df['event_timestamp'] = df['DATE_ISSUED'].fillna(df['LICENSE_STATUS_CHANGE_DATE']).fillna(df['APPLICATION_REQUIREMENTS_COMPLETE']).fillna(df['PAYMENT_DATE'])
-
-    print("Creating the created_timestamp...")
-    df['created_timestamp'] = df[['APPLICATION_REQUIREMENTS_COMPLETE', 'PAYMENT_DATE']].min(axis=1).fillna(df['event_timestamp'])
-
     print(f"Original number of rows: {len(df)}")
-    df.dropna(subset=['event_timestamp', 'created_timestamp', 'LICENSE_ID', 'LICENSE_STATUS'], inplace=True)
+
+    print("Converting date columns and creating event/created timestamps...")
+    df = add_feast_timestamps(df)
     print(f"Number of rows after cleaning: {len(df)}")
-    
-    df['LICENSE_ID'] = df['LICENSE_ID'].astype(int)
 
     output_path = Path(output_dir) / output_filename
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    
+
     print(f"Saving timestamped data to {output_path}...")
     df.to_csv(output_path, index=False)
     print("Data preparation for Feast is complete.")
 
+def _streaming_schema(columns: list) -> pa.Schema:
+    """Fixed output schema so every partition file can be read back as one dataset."""
+    fields = []
+    for name in columns + ['event_timestamp', 'created_timestamp']:
+        if name in DATE_COLUMNS or name in ('event_timestamp', 'created_timestamp'):
+            fields.append(pa.field(name, pa.timestamp("ns")))
+        elif name == 'LICENSE_ID':
+            fields.append(pa.field(name, pa.int64()))
+        elif name == 'SSA':
+            fields.append(pa.field(name, pa.float64()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+def _process_chunk(chunk_index: int, chunk: pd.DataFrame, output_root: str, schema: pa.Schema, date_format: str):
+    """Cleans one chunk and writes it as one Parquet part per event year."""
+    rows_in = len(chunk)
+    chunk = add_feast_timestamps(chunk, date_format=date_format)
+    chunk['SSA'] = pd.to_numeric(chunk['SSA'], errors='coerce')
+
+    for year, part in chunk.groupby(chunk['event_timestamp'].dt.year):
+        partition_dir = Path(output_root) / f"year={int(year)}"
+        partition_dir.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(part[schema.names], schema=schema, preserve_index=False)
+        pq.write_table(table, partition_dir / f"part-{chunk_index:05d}.parquet", compression="snappy")
+    return rows_in, len(chunk)
+
+def prepare_data_for_feast_streaming(
+    input_csv_path: str,
+    output_dir: str,
+    output_name: str = "License_Data_With_Timestamp",
+    chunk_size: int = 250_000,
+    workers: int = 1,
+    date_format: str = DEFAULT_DATE_FORMAT
+):
+    """
+    Processes the raw export in fixed-size chunks and writes a year-partitioned
+    Parquet dataset. At most two chunks per worker are in flight, so memory stays
+    flat regardless of input size. The dataset is built in a temporary directory and
+    swapped in at the end, so parts of an earlier run never mix with this one.
+    """
+    columns = pd.read_csv(input_csv_path, nrows=0).columns.tolist()
+    schema = _streaming_schema(columns)
+    output_root = Path(output_dir) / output_name
+    staging_root = Path(output_dir) / f".{output_name}.tmp"
+    shutil.rmtree(staging_root, ignore_errors=True)
+    staging_root.mkdir(parents=True)
+
+    print(f"Streaming raw data from {input_csv_path} in chunks of {chunk_size} rows with {workers} worker(s)...")
+    # Read everything as text and let each chunk apply the fixed schema, so column
+    # types cannot drift between chunks.
+    reader = pd.read_csv(input_csv_path, dtype=str, chunksize=chunk_size)
+    total_in, total_out = 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk_index, chunk in enumerate(reader):
+            pending.append(executor.submit(_process_chunk, chunk_index, chunk, str(staging_root), schema, date_format))
+            if len(pending) >= 2 * workers:
+                rows_in, rows_out = pending.popleft().result()
+                total_in, total_out = total_in + rows_in, total_out + rows_out
+        while pending:
+            rows_in, rows_out = pending.popleft().result()
+            total_in, total_out = total_in + rows_in, total_out + rows_out
+
+    previous_root = Path(output_dir) / f".{output_name}.old"
+    shutil.rmtree(previous_root, ignore_errors=True)
+    if output_root.exists():
+        output_root.rename(previous_root)
+    staging_root.rename(output_root)
+    shutil.rmtree(previous_root, ignore_errors=True)
+
+    print(f"Original number of rows: {total_in}")
+    print(f"Number of rows after cleaning: {total_out}")
+    print(f"Partitioned timestamped data written to {output_root}")
+    print("Data preparation for Feast is complete.")
+
 if __name__ == "__main__":
-    prepare_data_for_feast(
-        input_csv_path="data/License_Data.csv",
-        output_dir="feature_repo/data"
-    )
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default="data/License_Data.csv")
+    parser.add_argument("--output_dir", default="feature_repo/data")
+    parser.add_argument("--streaming", action="store_true", help="Process the input in chunks and write year-partitioned Parquet.")
+    parser.add_argument("--chunk_size", type=int, default=250_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--date_format", default=DEFAULT_DATE_FORMAT)
+    args = parser.parse_args()
+    if args.streaming:
+        prepare_data_for_feast_streaming(
+            input_csv_path=args.input,
+            output_dir=args.output_dir,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            date_format=args.date_format
+        )
+    else:
+        prepare_data_for_feast(
+            input_csv_path=args.input,
+            output_dir=args.output_dir
+        )
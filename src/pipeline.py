@@ -12,18 +12,40 @@ def license_pipeline(
     model_stage: str = "Staging",
     docker_registry_prefix: str = "yourdockerhubusername",
     gitops_manifest_repo_ssh_url: str = "git@github.com:your-username/mlops-manifests.git",
-    bento_image_tag: str = "latest"
+    bento_image_tag: str = "latest",
+    # Persistent training set on the cache volume, updated incrementally from its
+    # event_timestamp watermark. Leave empty to rebuild the whole dataset on every run.
+    materialized_training_data: str = "/app/cache/training/training_dataset.parquet",
+    full_rebuild: str = "false",
+    hyperparameter_search: str = "false",
+    # Content-addressed cache of step outputs: a mounted directory or an s3:// URI on the
+    # MinIO behind MLflow. Steps with unchanged inputs then reuse their previous outputs.
+    # Leave empty to rerun every step.
+    step_cache_uri: str = "",
+    # PersistentVolumeClaim mounted at /app/cache in steps that keep local caches (data
+    # profiles, preprocessing outputs, model artifacts, manifest working copy).
+    # ReadWriteMany if steps may run concurrently.
+    cache_pvc_name: str = "mlops-pipeline-cache"
 ):
+    cache_volume = dsl.PipelineVolume(pvc=cache_pvc_name)
+
     # ========================== Step 1: Generate Training Data from Feast ==========================
     generate_data_op = dsl.ContainerOp(
         name="generate-training-data",
         image=f"{docker_registry_prefix}/01_generate_training_data:{bento_image_tag}",
         arguments=[
             "--feast_repo", feast_repo_path,
-            "--output", "/app/training_dataset.csv"
+            "--output", "/app/training_dataset.parquet",
+            "--materialized", materialized_training_data,
+            "--full_rebuild", full_rebuild,
+            "--step_cache", step_cache_uri,
+            "--image_tag", bento_image_tag,
+            "--metrics_output", "/app/step_metrics.json"
         ],
-        file_outputs={"training_data": "/app/training_dataset.csv"}
+        file_outputs={"training_data": "/app/training_dataset.parquet", "metrics": "/app/step_metrics.json"}
     )
+    # Keeps the materialized training set and its watermark between runs
+    generate_data_op.add_pvolumes({"/app/cache": cache_volume})
 
     # ========================== Step 2: Validate Data (QUALITY GATE 1) ==========================
     validate_data_op = dsl.ContainerOp(
@@ -32,10 +54,34 @@ def license_pipeline(
         arguments=[
             "--reference_data", generate_data_op.outputs["training_data"], # In a real scenario, this would be a fixed reference file
             "--new_data", generate_data_op.outputs["training_data"],
-            "--report", "/app/validation_report.json"
+            "--report", "/app/validation_report.json",
+            "--step_cache", step_cache_uri,
+            "--image_tag", bento_image_tag,
+            "--metrics_output", "/app/step_metrics.json"
         ],
-        file_outputs={"report": "/app/validation_report.json"}
+        file_outputs={"report": "/app/validation_report.json", "metrics": "/app/step_metrics.json"}
     ).after(generate_data_op)
+    # Keeps data profiles (/app/cache/profiles) between runs
+    validate_data_op.add_pvolumes({"/app/cache": cache_volume})
+
+    # ========================== Step 3a: Hyperparameter Search (optional) ==========================
+    # Reuses the training image and only runs when enabled. The best parameters go to the
+    # cache volume under this run's ID, where training picks them up if the file exists.
+    best_params_path = f"/app/cache/tuning/{dsl.RUN_ID_PLACEHOLDER}/best_params.json"
+    with dsl.Condition(hyperparameter_search == "true"):
+        tune_op = dsl.ContainerOp(
+            name="tune-hyperparameters",
+            image=f"{docker_registry_prefix}/03_train_and_package:{bento_image_tag}",
+            command=["python", "tune_hyperparameters.py"],
+            arguments=[
+                "--config", config_path,
+                "--data", validate_data_op.inputs.parameters['new_data'],
+                "--best_params_output", best_params_path,
+                "--step_cache", step_cache_uri,
+                "--image_tag", bento_image_tag
+            ]
+        ).after(validate_data_op)
+        tune_op.add_pvolumes({"/app/cache": cache_volume})
 
     # ========================== Step 3: Train and Package Model with BentoML ==========================
     train_op = dsl.ContainerOp(
@@ -44,14 +90,21 @@ def license_pipeline(
         arguments=[
             "--config", config_path,
             "--data", validate_data_op.inputs.parameters['new_data'],
-            "--bento_tag_output", "/app/bento_tag.txt"
+            "--bento_tag_output", "/app/bento_tag.txt",
+            "--best_params_file", best_params_path,
+            "--step_cache", step_cache_uri,
+            "--image_tag", bento_image_tag,
+            # Stage timings of the data steps are logged to the training run
+            "--upstream_metrics", generate_data_op.outputs["metrics"], validate_data_op.outputs["metrics"]
         ],
         # Outputs for downstream components
         file_outputs={
             "mlflow_run_id": "/app/mlflow_run_id.txt",
             "bento_tag": "/app/bento_tag.txt"
         }
-    ).after(validate_data_op)
+    ).after(validate_data_op, tune_op)
+    # Keeps the fitted encoder and transformed splits (preprocessing_cache_dir) between runs
+    train_op.add_pvolumes({"/app/cache": cache_volume})
     
     # ========================== Step 4: Validate Model (QUALITY GATE 2) ==========================
     validate_model_op = dsl.ContainerOp(
@@ -60,9 +113,13 @@ def license_pipeline(
         arguments=[
             "--config", config_path,
             "--run_id", train_op.outputs["mlflow_run_id"],
-            "--test_data", validate_data_op.inputs.parameters['new_data'] # Using the same data for simplicity, ideally a held-out test set
+            "--test_data", validate_data_op.inputs.parameters['new_data'], # Using the same data for simplicity, ideally a held-out test set
+            "--step_cache", step_cache_uri,
+            "--image_tag", bento_image_tag
         ]
     ).after(train_op)
+    # Keeps downloaded model artifacts (model_cache.dir) between runs
+    validate_model_op.add_pvolumes({"/app/cache": cache_volume})
 
     # ========================== Step 5: Promote Model and Trigger GitOps ==========================
     trigger_gitops_op = dsl.ContainerOp(
@@ -72,10 +129,47 @@ def license_pipeline(
             "--config", config_path,
             "--run_id", train_op.outputs["mlflow_run_id"],
             "--stage", model_stage,
-            "--bento_tag", train_op.outputs["bento_tag"]
+            "--bento_tag", train_op.outputs["bento_tag"],
+            "--template", template_path
         ]
     ).after(validate_model_op)
-    # Mount the Git SSH key to allow pushing to the manifest repo
+    # Mount the Git SSH key to allow pushing to the manifest repo,
+    # and the cache volume to keep the manifest working copy between promotions
     trigger_gitops_op.add_pvolumes({
-        "/root/.ssh": dsl.PipelineVolume(secret=dsl.Secret(secret_name="gitops-ssh-secret"))
-    })
\ No newline at end of file
+        "/root/.ssh": dsl.PipelineVolume(secret=dsl.Secret(secret_name="gitops-ssh-secret")),
+        "/app/cache": cache_volume
+    })
+
+@dsl.pipeline(
+    name="License Classification Batch Scoring Pipeline",
+    description="Re-scores the full license base offline with the model promoted to a given stage."
+)
+def batch_scoring_pipeline(
+    config_path: str = "/app/config/params.yaml",
+    feast_repo_path: str = "/app/feature_repo",
+    # Should live on a persistent volume so an interrupted run resumes from its checkpoint
+    output_path: str = "/data/batch_predictions",
+    model_stage: str = "Production",
+    framework: str = "mlflow",
+    # Bento model tag; required when framework is sklearn or picklable_model
+    model: str = "",
+    workers: int = 4,
+    docker_registry_prefix: str = "yourdockerhubusername",
+    image_tag: str = "latest",
+    cache_pvc_name: str = "mlops-pipeline-cache"
+):
+    batch_score_op = dsl.ContainerOp(
+        name="batch-score-licenses",
+        image=f"{docker_registry_prefix}/06_batch_score:{image_tag}",
+        arguments=[
+            "--config", config_path,
+            "--feast_repo", feast_repo_path,
+            "--output", output_path,
+            "--stage", model_stage,
+            "--framework", framework,
+            "--model", model,
+            "--workers", workers
+        ]
+    )
+    # Reuses model artifacts downloaded by earlier runs (model_cache.dir)
+    batch_score_op.add_pvolumes({"/app/cache": dsl.PipelineVolume(pvc=cache_pvc_name)})